@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import ast
+import pickle
+from collections import Counter, deque
+from itertools import islice
+
+# Re-exports followed when resolving a name, guards against import cycles
+_MAX_REEXPORTS = 16
+_GRAPH_VERSION = 1
+
+def _dotted_name(node):
+    # Generic[T] inherits from Generic
+    if isinstance(node, ast.Subscript):
+        node = node.value
+
+    components = []
+    while isinstance(node, ast.Attribute):
+        components.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    components.append(node.id)
+    return '.'.join(reversed(components))
+
+def base_expressions(code):
+    """Extracts the base classes listed in the argument list of a class
+    definition, keyword arguments such as metaclass are skipped.
+
+    Args:
+        code (str): the source code between the parentheses of the
+            class definition
+
+    Returns:
+        list: the dotted names of the bases, as written
+    """
+    try:
+        call = ast.parse('_(%s)' % code.strip(), mode='eval').body
+    except SyntaxError:
+        return []
+
+    bases = []
+    for arg in call.args:
+        name = _dotted_name(arg)
+        if name:
+            bases.append(name)
+    return bases
+
+def _import_statements(body):
+    for node in body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield node
+        elif isinstance(node, (ast.If, ast.Try)):
+            # Conditional and fallback imports
+            bodies = [node.body, node.orelse, getattr(node, 'finalbody', [])]
+            bodies += [handler.body for handler in
+                    getattr(node, 'handlers', [])]
+            for body in bodies:
+                for sub in _import_statements(body):
+                    yield sub
+
+def module_imports(contents, modname, is_package):
+    """Maps the names a module imports at its top level to the qualified
+    names they refer to.
+
+    Args:
+        contents (str): the source code of the module
+        modname (str): the qualified name of the module
+        is_package (bool): whether the module is the `__init__` of a
+            package, relative imports are resolved against it then
+
+    Returns:
+        dict: local names to qualified names, empty if the module can
+            not be parsed
+    """
+    try:
+        tree = ast.parse(contents)
+    except (SyntaxError, ValueError):
+        return {}
+
+    package = modname if is_package else modname.rpartition('.')[0]
+    imports = {}
+    for node in _import_statements(tree.body):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imports[alias.asname] = alias.name
+                else:
+                    head = alias.name.split('.')[0]
+                    imports[head] = head
+            continue
+
+        source = node.module or ''
+        if node.level:
+            components = package.split('.') if package else []
+            components = components[:len(components) - node.level + 1]
+            source = '.'.join(components + ([source] if source else []))
+        for alias in node.names:
+            if alias.name == '*':
+                continue
+            imports[alias.asname or alias.name] = '.'.join(
+                    filter(None, (source, alias.name)))
+    return imports
+
+
+class ClassGraph(object):
+    """The inheritance relations between the scanned classes.
+
+    Classes are added with their bases as written while scanning, and
+    resolved to qualified names across all the scanned modules in a
+    single pass afterwards. Ancestry, method resolution order and
+    descendants are then memoized lookups.
+
+    What was added for each module is persisted, so that incremental
+    builds resolve against the modules that were not scanned again.
+    """
+    def __init__(self):
+        self.__classes = {}
+        self.__imports = {}
+        self.__bases = {}
+        self.__children = {}
+        self.__ancestry = {}
+        self.__mro = {}
+        self.__descendants = {}
+
+    def add_module(self, modname, imports):
+        self.__imports[modname] = imports
+
+    def add_class(self, name, modname, bases, members=()):
+        self.__classes[name] = (modname, bases, tuple(members))
+
+    def load(self, path, modules):
+        """Adds the classes and imports of the modules listed in
+        `modules`, as saved by a previous build.
+        """
+        try:
+            with open(path, 'rb') as _:
+                state = pickle.load(_)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return
+
+        if state.get('version') != _GRAPH_VERSION:
+            return
+
+        modules = set(modules)
+        for modname, imports in state['imports'].items():
+            if modname in modules:
+                self.__imports.setdefault(modname, imports)
+        for name, klass in state['classes'].items():
+            if klass[0] in modules:
+                self.__classes.setdefault(name, klass)
+
+    def save(self, path):
+        with open(path, 'wb') as _:
+            pickle.dump({'version': _GRAPH_VERSION,
+                'imports': self.__imports,
+                'classes': self.__classes}, _, pickle.HIGHEST_PROTOCOL)
+
+    def resolve(self):
+        """Resolves the bases of all the classes added so far."""
+        self.__bases = {}
+        self.__children = {}
+        self.__ancestry = {}
+        self.__mro = {}
+        self.__descendants = {}
+
+        for name, (modname, bases, _) in self.__classes.items():
+            resolved = [self.__resolve_name(modname, base) for base in bases]
+            self.__bases[name] = resolved
+            for base in resolved:
+                self.__children.setdefault(base, []).append(name)
+
+    def __resolve_name(self, modname, expr):
+        head, _, tail = expr.partition('.')
+        imports = self.__imports.get(modname, {})
+
+        if head in imports:
+            name = imports[head] + ('.' + tail if tail else '')
+        elif '%s.%s' % (modname, expr) in self.__classes:
+            return '%s.%s' % (modname, expr)
+        else:
+            name = expr
+
+        # Follow names packages re-export from their submodules
+        for _ in range(_MAX_REEXPORTS):
+            if name in self.__classes:
+                break
+            module, _, attr = name.rpartition('.')
+            target = self.__imports.get(module, {}).get(attr)
+            if target is None or target == name:
+                break
+            name = target
+
+        return name
+
+    def is_class(self, name):
+        return name in self.__classes
+
+    def get_bases(self, name):
+        return self.__bases.get(name, [])
+
+    def get_children(self, name):
+        return self.__children.get(name, [])
+
+    def get_members(self, name):
+        try:
+            return self.__classes[name][2]
+        except KeyError:
+            return ()
+
+    def get_ancestry(self, name):
+        """Returns the chain of primary bases of a class, from the root
+        down to its direct base. Bases that were not scanned end the
+        chain.
+        """
+        try:
+            return self.__ancestry[name]
+        except KeyError:
+            pass
+
+        chain = []
+        seen = set([name])
+        current = name
+        while True:
+            bases = self.__bases.get(current)
+            if not bases or bases[0] in seen:
+                break
+            current = bases[0]
+            if current in self.__ancestry:
+                chain.append(current)
+                break
+            seen.add(current)
+            chain.append(current)
+
+        # Every class along the chain gets its ancestry memoized too
+        ancestry = ()
+        if chain and chain[-1] in self.__ancestry:
+            ancestry = self.__ancestry[chain[-1]] + (chain.pop(),)
+        for base in reversed(chain):
+            self.__ancestry.setdefault(base, ancestry)
+            ancestry = ancestry + (base,)
+        self.__ancestry[name] = ancestry
+        return ancestry
+
+    def get_descendants(self, name):
+        """Returns all the classes inheriting from a class, directly or
+        not.
+        """
+        try:
+            return self.__descendants[name]
+        except KeyError:
+            pass
+
+        descendants = []
+        seen = set([name])
+        pending = list(self.get_children(name))
+        while pending:
+            child = pending.pop()
+            if child in seen:
+                continue
+            seen.add(child)
+            descendants.append(child)
+            pending.extend(self.get_children(child))
+
+        self.__descendants[name] = descendants
+        return descendants
+
+    def __linearize(self, name):
+        bases = [base for base in self.__bases.get(name, ()) if base != name]
+        sequences = [deque(self.__mro.get(base, (base,))) for base in bases]
+        sequences.append(deque(bases))
+
+        # How many sequences hold each class after their head, rather than
+        # searching all the tails for every candidate
+        in_tails = Counter()
+        for seq in sequences:
+            in_tails.update(islice(seq, 1, None))
+
+        result = [name]
+        seen = set(result)
+        while True:
+            sequences = [seq for seq in sequences if seq]
+            if not sequences:
+                break
+            for seq in sequences:
+                head = seq[0]
+                if not in_tails[head]:
+                    break
+            else:
+                # Inconsistent hierarchy, Python would refuse it, fall
+                # back to depth-first order
+                head = sequences[0][0]
+            if head not in seen:
+                seen.add(head)
+                result.append(head)
+            for seq in sequences:
+                if seq[0] == head:
+                    seq.popleft()
+                    if seq:
+                        in_tails[seq[0]] -= 1
+
+        return tuple(result)
+
+    def get_mro(self, name):
+        """Returns the C3 linearization of a class, starting with the
+        class itself. Bases that were not scanned appear without their
+        own bases.
+        """
+        try:
+            return self.__mro[name]
+        except KeyError:
+            pass
+
+        # Bases are linearized before the classes inheriting from them,
+        # without recursing as hierarchies may be deep
+        pending = [name]
+        visiting = set()
+        while pending:
+            current = pending[-1]
+            if current in self.__mro:
+                pending.pop()
+                continue
+            visiting.add(current)
+            missing = [base for base in self.__bases.get(current, ())
+                    if base not in self.__mro and base not in visiting]
+            if missing:
+                pending.extend(missing)
+                continue
+            pending.pop()
+            visiting.discard(current)
+            self.__mro[current] = self.__linearize(current)
+
+        return self.__mro[name]
+
+    def get_inherited_members(self, name):
+        """Lists the members a class inherits without overriding them.
+
+        Nothing is stored per class, the members are looked up in the
+        classes that define them.
+
+        Returns:
+            list: (owner, members) tuples in method resolution order,
+                `members` holds the names of the members `owner` defines
+                and the class inherits from it
+        """
+        seen = set(self.get_members(name))
+        inherited = []
+        for owner in self.get_mro(name)[1:]:
+            members = [member for member in self.get_members(owner)
+                    if member not in seen]
+            seen.update(members)
+            if members:
+                inherited.append((owner, members))
+        return inherited
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import pickle
+import re
+import zlib
+
+from hotdoc.core.exceptions import ConfigError
+from hotdoc.core.links import Link
+from hotdoc.utils.loggable import Logger, warn
+
+Logger.register_warning_code('python-inventory-issue', ConfigError)
+
+_LINE_RE = re.compile(r'(?x)(.+?)\s+(\S+)\s+(-?\d+)\s+?(\S*)\s+(.*)')
+_CACHE_VERSION = 1
+
+# Roles of the names types are referred to with in docstrings, a name
+# documented under several roles links to the first one
+_TYPE_ROLES = ('class', 'exception', 'data', 'function', 'attribute',
+        'method', 'module')
+
+# Names docstrings commonly use for the builtin types
+_TYPE_ALIASES = {
+    'none': 'None',
+    'boolean': 'bool',
+    'integer': 'int',
+    'string': 'str',
+    'unicode': 'str',
+    'true': 'True',
+    'false': 'False',
+    'dictionary': 'dict',
+}
+
+_HEADER = u"""# Sphinx inventory version 2
+# Project: %s
+# Version: %s
+# The remainder of this file is compressed using zlib.
+"""
+
+def write_inventory(path, project, version, entries):
+    """Writes a Sphinx inventory, as read by intersphinx.
+
+    Args:
+        path (str): the path of the `objects.inv` file
+        project (str): the name of the documented project
+        version (str): its version
+        entries (list): (name, role, uri) tuples, `role` being one of
+            the roles of the Sphinx python domain, `uri` relative to the
+            folder of the inventory, the first entry for a name wins
+    """
+    lines = []
+    seen = set()
+    for name, role, uri in sorted(entries, key=lambda entry: entry[0]):
+        if name in seen:
+            continue
+        seen.add(name)
+        # Sphinx abbreviates anchors repeating the name
+        if uri.endswith('#' + name):
+            uri = uri[:-len(name)] + '$'
+        lines.append(u'%s py:%s 1 %s -\n' % (name, role, uri))
+
+    with open(path, 'wb') as _:
+        _.write((_HEADER % (project, version)).encode('utf-8'))
+        _.write(zlib.compress(u''.join(lines).encode('utf-8'), 9))
+
+def read_inventory(path):
+    """Reads the python objects of a Sphinx inventory.
+
+    Args:
+        path (str): the path of the `objects.inv` file
+
+    Returns:
+        dict: names to (role, uri) tuples, `uri` being relative to
+            the documentation the inventory describes
+
+    Raises:
+        ValueError: if the file is not a version 2 inventory
+    """
+    with open(path, 'rb') as _:
+        header = [_.readline() for i in range(4)]
+        data = _.read()
+
+    if not header[0].startswith(b'# Sphinx inventory version 2'):
+        raise ValueError('not a version 2 Sphinx inventory')
+
+    try:
+        data = zlib.decompress(data).decode('utf-8')
+    except zlib.error as exc:
+        raise ValueError(str(exc))
+
+    objects = {}
+    for line in data.splitlines():
+        match = _LINE_RE.match(line.rstrip())
+        if not match:
+            continue
+        name, type_, _, uri, _ = match.groups()
+        domain, _, role = type_.partition(':')
+        if domain != 'py' or role not in _TYPE_ROLES:
+            continue
+        if uri.endswith('$'):
+            uri = uri[:-1] + name
+
+        current = objects.get(name)
+        if current is None or \
+                _TYPE_ROLES.index(role) < _TYPE_ROLES.index(current[0]):
+            objects[name] = (role, uri)
+
+    return objects
+
+
+class InventoryIndex(object):
+    """Resolves type names to the documentation of other projects, from
+    local Sphinx inventories.
+
+    Parsed inventories are cached as long as their file is unchanged.
+    Names are looked up in a dict, qualified or not: unqualified class
+    names are indexed too when they are unambiguous.
+    """
+    def __init__(self, cache_folder):
+        self.__cache_folder = cache_folder
+        self.__uris = {}
+        self.__short_names = {}
+        self.__links = {}
+
+    def __load_objects(self, path):
+        stat = os.stat(path)
+        stamp = (stat.st_mtime, stat.st_size)
+        cache = os.path.join(self.__cache_folder, 'python-inventory-%s.p' %
+                hashlib.sha1(path.encode('utf-8')).hexdigest())
+
+        try:
+            with open(cache, 'rb') as _:
+                cached = pickle.load(_)
+            if cached['version'] == _CACHE_VERSION and \
+                    cached['stamp'] == stamp:
+                return cached['objects']
+        except (IOError, OSError, EOFError, KeyError,
+                pickle.UnpicklingError):
+            pass
+
+        objects = read_inventory(path)
+        # The cache is only an optimization, the inventory was read
+        try:
+            with open(cache, 'wb') as _:
+                pickle.dump({'version': _CACHE_VERSION, 'stamp': stamp,
+                    'objects': objects}, _, pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError):
+            pass
+        return objects
+
+    def load(self, path, base_url):
+        """Adds the objects of an inventory to the index, the first
+        inventory documenting a name wins.
+
+        Args:
+            path (str): the path of the `objects.inv` file
+            base_url (str): the url of the documentation the inventory
+                describes. Inventories without one are skipped, links
+                to the folder of the inventory would point into the
+                file system of the build.
+        """
+        if not base_url:
+            warn('python-inventory-issue',
+                    'No url given for inventory %s, skipping it' % path)
+            return
+
+        try:
+            objects = self.__load_objects(path)
+        except (IOError, OSError, ValueError) as exc:
+            warn('python-inventory-issue',
+                    'Could not load inventory %s: %s' % (path, exc))
+            return
+
+        base_url = base_url.rstrip('/') + '/'
+
+        short_names = {}
+        for name, (role, uri) in objects.items():
+            if name in self.__uris:
+                continue
+            self.__uris[name] = base_url + uri
+            if role in ('class', 'exception') and '.' in name:
+                short_name = name.rpartition('.')[2]
+                short_names.setdefault(short_name, set()).add(name)
+
+        for short_name, names in short_names.items():
+            if short_name in self.__uris:
+                continue
+            if short_name in self.__short_names:
+                names = names | self.__short_names[short_name]
+            self.__short_names[short_name] = names
+
+    def get_link(self, name):
+        """Returns the link to a type documented by one of the inventories,
+        or None.
+        """
+        try:
+            return self.__links[name]
+        except KeyError:
+            pass
+
+        qualified = _TYPE_ALIASES.get(name, name)
+        uri = self.__uris.get(qualified)
+        if uri is None:
+            names = self.__short_names.get(qualified)
+            if names is not None and len(names) == 1:
+                qualified = next(iter(names))
+                uri = self.__uris[qualified]
+
+        link = None
+        if uri is not None:
+            link = Link(uri, qualified, qualified)
+        self.__links[name] = link
+        return link
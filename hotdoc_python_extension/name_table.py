@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import mmap
+import os
+import struct
+
+# Magic, number of names, offset of the sources
+_MAGIC = b'HDPYNT02'
+_HEADER = struct.Struct('<8sII')
+_OFFSET = struct.Struct('<I')
+
+def write_name_table(path, entries, sources):
+    """Writes a name table, replacing the previous one atomically.
+
+    The file starts with an array of record offsets sorted by name,
+    followed by the records and the list of the sources they come from.
+
+    Args:
+        path (str): the path of the table
+        entries (list): (name, title, ref, kind, source) tuples, the
+            first entry for a name wins
+        sources (dict): the sources the entries come from, to their
+            modification time when the table was written
+    """
+    source_names = sorted(sources)
+    source_indices = {source: i for i, source in enumerate(source_names)}
+
+    records = []
+    offset = 0
+    seen = set()
+    for name, title, ref, kind, source in sorted(entries,
+            key=lambda entry: entry[0]):
+        if name in seen:
+            continue
+        seen.add(name)
+        record = u'%s\0%s\0%s\0%s\0%d\n' % (name, title or '', ref or '',
+                kind or '', source_indices.get(source, -1))
+        record = record.encode('utf-8')
+        records.append((offset, record))
+        offset += len(record)
+
+    count = len(records)
+    base = _HEADER.size + count * _OFFSET.size
+    blob = b''.join(record[1] for record in records)
+    sources_blob = json.dumps([[source, sources[source]]
+        for source in source_names]).encode('utf-8')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as _:
+        _.write(_HEADER.pack(_MAGIC, count, base + len(blob)))
+        _.write(struct.pack('<%dI' % count,
+            *[base + record[0] for record in records]))
+        _.write(blob)
+        _.write(sources_blob)
+    os.replace(tmp_path, path)
+
+
+class NameTable(object):
+    """The qualified names of the python symbols of the previous build,
+    with their link targets.
+
+    The table is memory-mapped rather than loaded, names are looked up
+    with a binary search over a sorted array of offsets, so opening it
+    costs the same whatever the number of symbols, and only the pages
+    holding the names that are looked up are read.
+    """
+    def __init__(self, path):
+        self.__file = None
+        self.__map = None
+        self.__count = 0
+        self.__sources = None
+        self.__sources_offset = 0
+
+        if path is None or not os.path.exists(path):
+            return
+
+        try:
+            self.__file = open(path, 'rb')
+            self.__map = mmap.mmap(self.__file.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+            magic, count, sources_offset = _HEADER.unpack_from(self.__map)
+        except (IOError, OSError, ValueError, struct.error):
+            self.close()
+            return
+
+        if magic != _MAGIC or sources_offset > len(self.__map):
+            self.close()
+            return
+
+        self.__count = count
+        self.__sources_offset = sources_offset
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def __offset(self, i):
+        return _OFFSET.unpack_from(self.__map,
+                _HEADER.size + i * _OFFSET.size)[0]
+
+    def __key(self, offset):
+        return self.__map[offset:self.__map.find(b'\0', offset)]
+
+    def __lower_bound(self, key):
+        # Inlined, this runs for every lookup
+        data = self.__map
+        unpack_from = _OFFSET.unpack_from
+        base = _HEADER.size
+        low, high = 0, self.__count
+        while low < high:
+            middle = (low + high) // 2
+            offset = unpack_from(data, base + middle * _OFFSET.size)[0]
+            if data[offset:data.find(b'\0', offset)] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __record(self, offset):
+        end = self.__map.find(b'\n', offset)
+        name, title, ref, kind, source = \
+                self.__map[offset:end].decode('utf-8').split(u'\0')
+        return (name, title or None, ref or None, kind or None,
+                self.__get_source(int(source)))
+
+    def __get_source(self, index):
+        if self.__sources is None:
+            self.__sources = json.loads(
+                    self.__map[self.__sources_offset:].decode('utf-8'))
+        if 0 <= index < len(self.__sources):
+            return self.__sources[index][0]
+        return None
+
+    def get(self, name):
+        """Looks up a qualified name.
+
+        Returns:
+            tuple: the (title, ref, kind, source) of the name, or None
+        """
+        if not self.__count:
+            return None
+
+        key = name.encode('utf-8')
+        i = self.__lower_bound(key)
+        if i == self.__count:
+            return None
+        offset = self.__offset(i)
+        if self.__key(offset) != key:
+            return None
+        return self.__record(offset)[1:]
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __iter__(self):
+        """Yields the (name, title, ref, kind, source) tuples of all the
+        names, sorted by name.
+        """
+        for i in range(self.__count):
+            yield self.__record(self.__offset(i))
+
+    def covers(self, sources):
+        """Whether the table holds the current symbols of `sources`, that
+        is whether each of them was unchanged when it was written.
+        """
+        if self.__map is None:
+            return False
+
+        self.__get_source(-1)
+        stamps = dict((source, mtime) for source, mtime in self.__sources)
+        for source in sources:
+            try:
+                if stamps.get(source) != os.path.getmtime(source):
+                    return False
+            except OSError:
+                return False
+        return True
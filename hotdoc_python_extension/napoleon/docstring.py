@@ -18,7 +18,7 @@ import re
 from six import string_types
 from six.moves import range
 
-from hotdoc_python_extension.napoleon.iterators import modify_iter
+from hotdoc_python_extension.napoleon.iterators import peek_cursor
 
 
 _directive_regex = re.compile(r'\.\. \S+::')
@@ -118,7 +118,7 @@ class GoogleDocstring(object):
         if isinstance(docstring, string_types):
             docstring = docstring.splitlines()
         self._lines = docstring
-        self._line_iter = modify_iter(docstring, modifier=lambda s: s.rstrip())
+        self._line_iter = peek_cursor(docstring, modifier=lambda s: s.rstrip())
         self._parsed_lines = []
         self._is_in_section = False
         self._section_indent = 0
@@ -149,6 +149,7 @@ class GoogleDocstring(object):
                 'yield': self._parse_yields_section,
                 'yields': self._parse_yields_section,
             }
+        self._analyze_lines(self._line_iter.peek(len(docstring)))
         self._parse()
 
     def __unicode__(self):
@@ -176,29 +177,62 @@ class GoogleDocstring(object):
         """
         return self._parsed_lines
 
+    def _analyze_lines(self, lines):
+        """Compute once what the parser needs to know about each line.
+
+        For each line of the docstring, stores its indentation, whether it
+        is blank and whether it looks like a google section header, as
+        well as the indentation of the next line that is not blank.
+
+        """
+        n = len(lines)
+        self._line_count = n
+        self._line_blank = [True] * n
+        self._line_indent = [0] * n
+        self._line_header = [False] * n
+        self._next_indent = [0] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            line = lines[i]
+            if not line:
+                self._next_indent[i] = self._next_indent[i + 1]
+                continue
+            indent = self._get_indent(line)
+            self._line_blank[i] = False
+            self._line_indent[i] = indent
+            self._next_indent[i] = indent
+            section = line.lower()
+            self._line_header[i] = bool(
+                _google_section_regex.match(section) and
+                section.strip(':') in self._sections)
+
+    def _at_blank(self):
+        pos = self._line_iter.position
+        return pos < self._line_count and self._line_blank[pos]
+
+    def _at_indented(self, indent):
+        pos = self._line_iter.position
+        return (pos < self._line_count and not self._line_blank[pos] and
+                self._line_indent[pos] >= indent)
+
     def _consume_indented_block(self, indent=1):
         lines = []
-        line = self._line_iter.peek()
         while(not self._is_section_break() and
-              (not line or self._is_indented(line, indent))):
+              (self._at_blank() or self._at_indented(indent))):
             lines.append(next(self._line_iter))
-            line = self._line_iter.peek()
         return lines
 
     def _consume_contiguous(self):
         lines = []
-        while (self._line_iter.has_next() and
-               self._line_iter.peek() and
+        while (self._line_iter.position < self._line_count and
+               not self._at_blank() and
                not self._is_section_header()):
             lines.append(next(self._line_iter))
         return lines
 
     def _consume_empty(self):
         lines = []
-        line = self._line_iter.peek()
-        while self._line_iter.has_next() and not line:
+        while self._at_blank():
             lines.append(next(self._line_iter))
-            line = self._line_iter.peek()
         return lines
 
     def _consume_field(self, parse_type=True, prefer_type=False):
@@ -368,13 +402,8 @@ class GoogleDocstring(object):
         return lines
 
     def _get_current_indent(self, peek_ahead=0):
-        line = self._line_iter.peek(peek_ahead + 1)[peek_ahead]
-        while line != self._line_iter.sentinel:
-            if line:
-                return self._get_indent(line)
-            peek_ahead += 1
-            line = self._line_iter.peek(peek_ahead + 1)[peek_ahead]
-        return 0
+        pos = min(self._line_iter.position + peek_ahead, self._line_count)
+        return self._next_indent[pos]
 
     def _get_indent(self, line):
         for i, s in enumerate(line):
@@ -405,13 +434,15 @@ class GoogleDocstring(object):
         return False
 
     def _is_section_header(self):
-        section = self._line_iter.peek().lower()
-        match = _google_section_regex.match(section)
-        if match and section.strip(':') in self._sections:
-            header_indent = self._get_indent(section)
+        pos = self._line_iter.position
+        if pos >= self._line_count:
+            return False
+        if self._line_header[pos]:
+            header_indent = self._line_indent[pos]
             section_indent = self._get_current_indent(peek_ahead=1)
             return section_indent > header_indent
         elif self._directive_sections:
+            section = self._line_iter.peek().lower()
             if _directive_regex.match(section):
                 for directive_section in self._directive_sections:
                     if section.startswith(directive_section):
@@ -419,12 +450,11 @@ class GoogleDocstring(object):
         return False
 
     def _is_section_break(self):
-        line = self._line_iter.peek()
-        return (not self._line_iter.has_next() or
+        return (self._line_iter.position >= self._line_count or
                 self._is_section_header() or
                 (self._is_in_section and
-                    line and
-                    not self._is_indented(line, self._section_indent)))
+                    not self._at_blank() and
+                    not self._at_indented(self._section_indent)))
 
     def _parse(self):
         self._parsed_lines = self._consume_empty()
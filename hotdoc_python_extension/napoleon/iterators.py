@@ -237,3 +237,90 @@ class modify_iter(peek_iter):
         except StopIteration:
             while len(self._cache) < n:
                 self._cache.append(self.sentinel)
+
+
+class peek_cursor(object):
+    """An index-based iterator over a sequence that supports peeking ahead.
+
+    `peek_cursor` offers the interface of `peek_iter`, but works on a
+    sequence that is fully known upfront, so that `next`, `peek` and
+    `has_next` only ever move or compare an index, without caching nor
+    comparing items to the sentinel.
+
+    Parameters
+    ----------
+    seq : sequence
+        The items to iterate over.
+
+    modifier : callable, optional
+        If given, `modifier` is called once with each item of `seq`, and
+        the returned values are iterated over instead.
+
+    Attributes
+    ----------
+    sentinel
+        The value `peek` returns, or uses to pad the list it returns, once
+        the iterator is exhausted. Always a new ``object()`` instance.
+    position : int
+        The index of the next item that will be returned.
+
+    """
+    def __init__(self, seq, modifier=None):
+        if modifier is not None:
+            seq = [modifier(item) for item in seq]
+        self._items = seq
+        self._length = len(seq)
+        self.sentinel = object()
+        self.position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self, n=None):
+        return self.next(n)
+
+    def has_next(self):
+        """Determine if iterator is exhausted.
+
+        Returns
+        -------
+        bool
+            True if iterator has more items, False otherwise.
+
+        """
+        return self.position < self._length
+
+    def next(self, n=None):
+        """Get the next item or `n` items of the iterator.
+
+        See `peek_iter.next`.
+
+        """
+        position = self.position
+        if not n:
+            if position >= self._length:
+                raise StopIteration
+            if n is None:
+                self.position = position + 1
+                return self._items[position]
+            return []
+        if position + n > self._length:
+            raise StopIteration
+        self.position = position + n
+        return list(self._items[position:position + n])
+
+    def peek(self, n=None):
+        """Preview the next item or `n` items of the iterator.
+
+        See `peek_iter.peek`.
+
+        """
+        position = self.position
+        if n is None:
+            if position < self._length:
+                return self._items[position]
+            return self.sentinel
+        result = list(self._items[position:position + n])
+        if len(result) < n:
+            result.extend([self.sentinel] * (n - len(result)))
+        return result
@@ -16,22 +16,31 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
 import re
+import string
 import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-from docutils.utils import Reporter
+from docutils.utils import Reporter, new_document
+from docutils.frontend import OptionParser
 from docutils.core import publish_parts
-from docutils.utils import error_reporting
 from docutils import nodes
+from docutils.languages import get_language
 from hotdoc.core.comment import Comment
 from hotdoc.core.exceptions import HotdocSourceException
+from hotdoc.core.links import Link
 from hotdoc.utils.loggable import Logger, warn
 from docutils.statemachine import ViewList
 from docutils.writers.html4css1 import Writer as HtmlWriter
-from docutils.parsers.rst import roles, directives
+from docutils.parsers.rst import Parser, roles, directives
 from xml.sax.saxutils import unescape
 
 from hotdoc_python_extension.napoleon import Config
+from hotdoc_python_extension.scheduling import MIN_BATCH_SECONDS
 from hotdoc_python_extension.napoleon import docstring
 
 
@@ -39,6 +48,7 @@ Logger.register_warning_code('python-doc-issue', HotdocSourceException)
 
 
 _google_typed_arg_regex = re.compile(r'\s*(.+?)\s*\(\s*(.+?)\s*\)')
+_numpy_section_regex = docstring._numpy_section_regex
 
 class MyGoogleDocString(docstring.GoogleDocstring):
     def __init__(self, *args, **kwargs):
@@ -76,10 +86,17 @@ class MyGoogleDocString(docstring.GoogleDocstring):
                 _desc = split[1].lstrip()
 
         _desc = [_desc] + self._dedent(self._consume_indented_block(indent))
-        _desc = self.__class__(_desc, self._config).lines()
+        _desc = self._parse_field_description(_desc)
 
         return _name, _type, _desc
 
+    def _parse_field_description(self, lines):
+        lines = [line.rstrip() for line in lines]
+        # Parsing a description without sections would return it as is
+        if _may_have_sections(lines):
+            return self.__class__(lines, self._config).lines()
+        return lines
+
     def _parse_parameters_section(self, section):
         self.param_fields.extend(self._consume_fields())
         return []
@@ -92,10 +109,100 @@ class MyGoogleDocString(docstring.GoogleDocstring):
         self.return_fields.extend(self._consume_fields(prefer_type=True))
         return []
 
+class MyNumpyDocString(docstring.NumpyDocstring):
+    def __init__(self, *args, **kwargs):
+        self.param_fields = []
+        self.attribute_fields = []
+        self.return_fields = []
+        docstring.NumpyDocstring.__init__(self, *args, **kwargs)
+
+    def _consume_field(self, parse_type=True, prefer_type=False):
+        line = next(self._line_iter)
+        if parse_type:
+            _name, _, _type = self._partition_field_on_colon(line)
+        else:
+            _name, _type = line, ''
+        _name, _type = _name.strip(), _type.strip()
+
+        if _name[:2] == '**':
+            _name = r'\*\*'+_name[2:]
+        elif _name[:1] == '*':
+            _name = r'\*'+_name[1:]
+
+        if prefer_type and not _type:
+            _type, _name = _name, _type
+        indent = self._get_indent(line)
+        _desc = self._dedent(self._consume_indented_block(indent + 1))
+        _desc = self._parse_field_description(_desc)
+
+        return _name, _type, _desc
+
+    def _parse_field_description(self, lines):
+        if _doc_style(lines) == 'numpy':
+            return self.__class__(lines, self._config).lines()
+        return lines
+
+    def _is_section_break(self):
+        # NumPy fields are not indented, a Google section header would be
+        # taken for one more field rather than left to MyGoogleDocString
+        if docstring.NumpyDocstring._is_section_break(self):
+            return True
+        pos = self._line_iter.position
+        return (self._is_in_section and pos < self._line_count and
+                self._line_header[pos] and
+                self._get_current_indent(peek_ahead=1) >
+                self._line_indent[pos])
+
+    def _parse_parameters_section(self, section):
+        self.param_fields.extend(self._consume_fields())
+        return []
+
+    def _parse_attributes_section(self, section):
+        self.attribute_fields.extend(self._consume_fields())
+        return []
+
+    def _parse_returns_section(self, section):
+        self.return_fields.extend(self._consume_returns_section())
+        return []
+
 config = Config(napoleon_use_param=True, napoleon_use_rtype=True)
 
-def strip_doc(doc):
-    return '\n'.join([l.lstrip() for l in doc.split('\n')])
+_SECTION_NAMES = frozenset(MyGoogleDocString('', config)._sections)
+
+def _may_have_sections(lines):
+    # Section headers are lines such as "Args:", any docstring without
+    # one is left untouched by napoleon.
+    for line in lines:
+        if line.endswith(':') and line.lower().strip(':') in _SECTION_NAMES:
+            return True
+    return False
+
+# Tells Google style ("Args:") from NumPy style ("Parameters" over a
+# "----------" underline) in a single pass, the styles are listed in the
+# order their first header appears. An empty list means napoleon would
+# leave the docstring untouched.
+def _doc_styles(lines):
+    styles = []
+    after_header = False
+    for line in lines:
+        if after_header and _numpy_section_regex.match(line):
+            style = 'numpy'
+        else:
+            stripped = line.strip()
+            after_header = stripped.lower() in _SECTION_NAMES
+            if after_header or not line.endswith(':') or \
+                    line.lower().strip(':') not in _SECTION_NAMES:
+                continue
+            style = 'google'
+        if style not in styles:
+            styles.append(style)
+            if len(styles) == 2:
+                break
+    return styles
+
+def _doc_style(lines):
+    styles = _doc_styles(lines)
+    return styles[0] if styles else None
 
 # From http://stackoverflow.com/questions/2504411/proper-indentation-for-python-multiline-strings
 def trim(docstring):
@@ -123,43 +230,72 @@ def trim(docstring):
     # Return a single string:
     return '\n'.join(trimmed)
 
+def _freeze_fields(fields):
+    return tuple((name, type_, '\n'.join(desc))
+            for name, type_, desc in fields)
+
+# Overridden methods, mixins and wrappers often share their docstring,
+# identical docstrings are only parsed once.
+@lru_cache(maxsize=4096)
+def _parse_doc(doc):
+    doc = trim(doc)
+
+    styles = _doc_styles(doc.split('\n'))
+    if not styles:
+        return doc, doc, (), (), ()
+
+    # Sections of the other style are left as text by the first parser,
+    # mixed docstrings go through the other one as well
+    lines = doc
+    param_fields, attribute_fields, return_fields = (), (), ()
+    for style in styles:
+        if style == 'numpy':
+            docstring = MyNumpyDocString(lines, config)
+        else:
+            docstring = MyGoogleDocString(lines, config)
+        lines = docstring.lines()
+        param_fields += _freeze_fields(docstring.param_fields)
+        attribute_fields += _freeze_fields(docstring.attribute_fields)
+        return_fields += _freeze_fields(docstring.return_fields)
+    return (doc, u'\n'.join(lines), param_fields, attribute_fields,
+            return_fields)
+
 def google_doc_to_native(doc):
     if not doc:
         return (None, {})
 
-    doc = trim(doc)
-
-    docstring = MyGoogleDocString(doc, config)
-    comment = Comment(description=docstring.__unicode__(),
+    doc, description, param_fields, attribute_fields, return_fields = \
+            _parse_doc(doc)
+    comment = Comment(description=description,
             raw_comment=doc)
 
-    for field in docstring.param_fields:
+    for field in param_fields:
         tags = {}
         if field[1]:
             tags['type'] = field[1]
 
         param_comment = Comment(name=field[0],
-                description='\n'.join(field[2]),
+                description=field[2],
                 tags=tags)
         comment.params[field[0]] = param_comment
 
     attr_comments = {}
-    for field in docstring.attribute_fields:
+    for field in attribute_fields:
         tags = {}
         if field[1]:
             tags['type'] = field[1]
         prop_comment = Comment(name=field[0],
-                description='\n'.join(field[2]),
+                description=field[2],
                 tags = tags)
         attr_comments[field[0]] = prop_comment
 
     return_comments = []
-    for field in docstring.return_fields:
+    for field in return_fields:
         tags = {}
         if field[1]:
             tags['type'] = field[1]
         return_comment = Comment(
-                description='\n'.join(field[2]),
+                description=field[2],
                 tags=tags)
         return_comments.append(return_comment)
 
@@ -167,6 +303,256 @@ def google_doc_to_native(doc):
 
     return comment, attr_comments
 
+# Words of type descriptions that do not name a type, as in
+# "list of int, optional"
+_TYPE_WORDS = frozenset(['a', 'an', 'and', 'default', 'from', 'if', 'of',
+    'optional', 'or', 'the', 'to', 'with'])
+
+_TYPE_PART_RE = re.compile(r"""'[^']*'|"[^"]*"|"""
+        r'(?::[\w:-]+:)?`~?(?:[^`<]*<)?([^`<>]+)>?`|'
+        r'([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)')
+
+# The same type descriptions are used over and over
+@lru_cache(maxsize=4096)
+def type_expression_parts(text):
+    """Splits a type description in the names of the types it refers to
+    and the text around them, for example `list of Foo`,
+    `dict(str, Bar)` or `Optional[Baz]`.
+
+    Args:
+        text (str): the type, as given in a docstring
+
+    Returns:
+        tuple: (text, is_name) tuples, the names of cross-references
+            such as :class:`~foo.Bar` are stripped of their markup
+    """
+    parts = []
+
+    def add_text(part):
+        if not part:
+            return
+        if parts and not parts[-1][1]:
+            parts[-1] = (parts[-1][0] + part, False)
+        else:
+            parts.append((part, False))
+
+    pos = 0
+    for match in _TYPE_PART_RE.finditer(text):
+        add_text(text[pos:match.start()])
+        pos = match.end()
+        name = match.group(1) or match.group(2)
+        if name is None or name in _TYPE_WORDS:
+            add_text(match.group(0))
+        else:
+            parts.append((name.strip(), True))
+    add_text(text[pos:])
+
+    return tuple(parts)
+
+# Structured representation of a translated docstring, see
+# `structured_blocks`. Inlines are either plain strings, `Reference` or
+# `Literal`.
+Paragraph = namedtuple('Paragraph', ['inlines'])
+Reference = namedtuple('Reference', ['text'])
+Literal = namedtuple('Literal', ['text'])
+Rubric = namedtuple('Rubric', ['text'])
+CodeBlock = namedtuple('CodeBlock', ['text', 'doctest'])
+Admonition = namedtuple('Admonition', ['kind', 'blocks'])
+# Free-form rst, left to docutils. lineno is the offset of the block in
+# the docstring, top whether it starts the document.
+RestBlock = namedtuple('RestBlock', ['text', 'lineno', 'top'])
+
+_ADMONITIONS = frozenset(['attention', 'caution', 'danger', 'error', 'hint',
+    'important', 'note', 'tip', 'warning'])
+
+# Constructs whose meaning depends on the rest of the document: titles,
+# transitions, targets, references, footnotes, substitutions and
+# directives acting on other parts of the document. Docstrings using them
+# are left to docutils as a whole.
+_NONLOCAL_RST_RE = re.compile(r'_(?!\w)|\||'
+        r'^\s*\.\. (?:[_\[]|(?:contents|sectnum|section-numbering|header|'
+        r'footer|title|meta|role|default-role|target-notes|include)::)|'
+        r'^([!-/:-@\[-`{-~])\1*\s*$', re.M)
+_DUNDER_RE = re.compile(r'\b__\w+__\b')
+# Characters docutils expands or splits lines on
+_IRREGULAR_SPACE_RE = re.compile(u'[\t\r\v\f\x1c-\x1e\x85\u2028\u2029]')
+
+_PLAIN_START_RE = re.compile(r'[\w"\'(]')
+_ENUMERATOR_RE = re.compile(
+        r'\(?(?:\d+|[a-zA-Z]|[ivxlcdmIVXLCDM]+|#)[.)](?:\s|$)')
+_DOCTEST_RE = re.compile(r'>>>(?: |$)')
+_DIRECTIVE_RE = re.compile(r'\.\. ([\w-]+)::(?: +(.*))?$')
+_INLINE_RE = re.compile(r'(?:(?<=[\s(])|^)'
+        r'(?:``([^`\s)]+(?: [^`\s]+)*)``|`([\w.]+)`)'
+        r'(?=[\s.,;:!?)"\']|$)')
+_UNSAFE_TEXT_RE = re.compile(r'[`*\\|]|_(?!\w)|:\S|\S@\S')
+
+def _parse_inlines(text):
+    inlines = []
+    pos = 0
+    for match in _INLINE_RE.finditer(text):
+        inlines.append(text[pos:match.start()])
+        if match.group(1) is not None:
+            inlines.append(Literal(match.group(1)))
+        else:
+            inlines.append(Reference(match.group(2)))
+        pos = match.end()
+    inlines.append(text[pos:])
+
+    for inline in inlines:
+        if isinstance(inline, str) and _UNSAFE_TEXT_RE.search(inline):
+            return None
+    return tuple(inline for inline in inlines if inline)
+
+def _is_plain_line(line):
+    return (_PLAIN_START_RE.match(line) is not None and
+            _ENUMERATOR_RE.match(line) is None)
+
+def _indented(line):
+    return line[:1].isspace()
+
+def _dedent_lines(lines):
+    indent = min(len(line) - len(line.lstrip()) for line in lines if line)
+    return [line[indent:] for line in lines]
+
+def _split_chunks(lines):
+    chunks = []
+    start = None
+    for i, line in enumerate(lines):
+        if line:
+            if start is None:
+                start = i
+        elif start is not None:
+            chunks.append((start, i))
+            start = None
+    if start is not None:
+        chunks.append((start, len(lines)))
+    return chunks
+
+def _following_indented(lines, chunks, i):
+    while i < len(chunks) and _indented(lines[chunks[i][0]]):
+        i += 1
+    return i
+
+def _parse_chunk(lines, chunks, i):
+    start, end = chunks[i]
+    first = lines[start]
+
+    if first.startswith('.. '):
+        match = _DIRECTIVE_RE.match(first)
+        if match is None:
+            return None, i + 1
+        if match.group(1) == 'rubric':
+            inlines = match.group(2) and _parse_inlines(match.group(2))
+            if end - start != 1 or not inlines or \
+                    not all(isinstance(inline, str) for inline in inlines):
+                return None, i + 1
+            return [Rubric(match.group(2))], i + 1
+        if match.group(1) not in _ADMONITIONS:
+            return None, i + 1
+
+        j = _following_indented(lines, chunks, i + 1)
+        content = lines[start + 1:chunks[j - 1][1]]
+        if not all(not line or _indented(line) for line in content):
+            return None, i + 1
+        content = _dedent_lines(content) if any(content) else []
+        if match.group(2):
+            content.insert(0, match.group(2))
+        blocks = _parse_blocks(content)
+        if not blocks or not all(isinstance(block, (Paragraph, CodeBlock))
+                for block in blocks):
+            return None, i + 1
+        return [Admonition(match.group(1), tuple(blocks))], j
+
+    paragraph = lines[start:end]
+    text = '\n'.join(paragraph)
+    if _DOCTEST_RE.match(first):
+        if any(_indented(line) for line in paragraph):
+            return None, i + 1
+        return [CodeBlock(text, True)], i + 1
+
+    if not all(_is_plain_line(line) for line in paragraph):
+        return None, i + 1
+
+    if not text.endswith('::'):
+        inlines = _parse_inlines(text)
+        if inlines is None:
+            return None, i + 1
+        return [Paragraph(inlines)], i + 1
+
+    # A literal block follows, docutils warns on the next line otherwise
+    j = _following_indented(lines, chunks, i + 1)
+    if j == i + 1:
+        return None, min(i + 2, len(chunks))
+    literal = lines[chunks[i + 1][0]:chunks[j - 1][1]]
+    if not all(not line or _indented(line) for line in literal):
+        return None, i + 1
+
+    if text == '::':
+        text = ''
+    elif text[-3] in ' \n':
+        text = text[:-3].rstrip()
+    else:
+        text = text[:-1]
+
+    blocks = []
+    if text:
+        inlines = _parse_inlines(text)
+        if inlines is None:
+            return None, i + 1
+        blocks.append(Paragraph(inlines))
+    blocks.append(CodeBlock('\n'.join(_dedent_lines(literal)), False))
+    return blocks, j
+
+def _parse_blocks(lines):
+    blocks = []
+    chunks = _split_chunks(lines)
+    rest = None
+    i = 0
+    while i < len(chunks):
+        parsed, next_i = _parse_chunk(lines, chunks, i)
+        if parsed is None:
+            # docutils looks for the literal block in the next chunk, and
+            # warns on its first line when there is none
+            if lines[chunks[next_i - 1][1] - 1].endswith('::'):
+                next_i = min(next_i + 1, len(chunks))
+            if rest is None:
+                rest = (chunks[i][0], not blocks)
+            rest_end = chunks[next_i - 1][1]
+        else:
+            if rest is not None:
+                blocks.append(RestBlock('\n'.join(lines[rest[0]:rest_end]),
+                    rest[0], rest[1]))
+                rest = None
+            blocks.extend(parsed)
+        i = next_i
+
+    if rest is not None:
+        blocks.append(RestBlock('\n'.join(lines[rest[0]:rest_end]),
+            rest[0], rest[1]))
+    return blocks
+
+@lru_cache(maxsize=4096)
+def structured_blocks(text):
+    """Splits a translated docstring in structured blocks.
+
+    Paragraphs, admonitions, rubrics, code blocks and cross-references
+    can be rendered without going through docutils, consecutive blocks
+    using any other rst construct end up in a `RestBlock`.
+
+    Args:
+        text (str): the description of a comment, as output by
+            `google_doc_to_native`
+
+    Returns:
+        tuple: the blocks
+    """
+    if _IRREGULAR_SPACE_RE.search(text) or \
+            _NONLOCAL_RST_RE.search(_DUNDER_RE.sub('', text)):
+        return (RestBlock(text, 0, True),)
+
+    return tuple(_parse_blocks([line.rstrip() for line in text.split('\n')]))
+
 class HotdocRestHtmlWriter(HtmlWriter):
     pass
 
@@ -195,20 +581,96 @@ def _nested_parse_with_titles(state, content, node):
     state.memo.title_styles = surrounding_title_styles
     state.memo.section_level = surrounding_section_level
 
-_CALLABLE_RE = \
-re.compile(r"^(?P<pre>.*?)(?P<module>[a-zA-Z0-9_.]*?)(?P<name>[a-zA-Z0-9_]+)\s*\((?P<args>.*?)\)(?P<rest>\s*->.*?)?$")
-_OTHER_RE = \
-re.compile(r"^(?P<pre>.*?)(?P<module>[a-zA-Z0-9_.]*?)(?P<name>[a-zA-Z0-9_]+)\s*$")
+_NAME_CHARS = frozenset(string.ascii_letters + string.digits + '_')
+_MODULE_CHARS = _NAME_CHARS | frozenset('.')
+
+# Splits a code item signature into pre, module, name, args and rest.
+# This used to be done with regular expressions, whose nested lazy
+# quantifiers backtrack heavily on long or malformed signatures; this
+# gives the same results in a couple of linear passes.
+def _split_signature(text, callable_):
+    n = len(text)
+    word_end = [n] * (n + 1)
+    module_end = [n] * (n + 1)
+    next_nonspace = [n] * (n + 1)
+    next_newline = [n] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        c = text[i]
+        word_end[i] = word_end[i + 1] if c in _NAME_CHARS else i
+        module_end[i] = module_end[i + 1] if c in _MODULE_CHARS else i
+        next_nonspace[i] = next_nonspace[i + 1] if c.isspace() else i
+        next_newline[i] = next_newline[i + 1] if c != '\n' else i
+
+    # "$" also matches before a trailing newline
+    end = n - 1 if text.endswith('\n') else n
+    last_inner_newline = text.rfind('\n', 0, end)
+
+    def rest_at(start):
+        if start >= end:
+            return None, True
+        arrow = next_nonspace[start]
+        if (text.startswith('->', arrow) and
+                last_inner_newline < arrow + 2):
+            return text[start:end], True
+        return None, False
+
+    if callable_:
+        next_close = [n] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            if text[i] == ')' and rest_at(i + 1)[1]:
+                next_close[i] = i
+            else:
+                next_close[i] = next_close[i + 1]
+
+        def tail_at(name_end):
+            opening = next_nonspace[name_end]
+            if opening == n or text[opening] != '(':
+                return None
+            closing = next_close[opening + 1]
+            if closing >= next_newline[opening + 1]:
+                return None
+            return {'args': text[opening + 1:closing],
+                    'rest': rest_at(closing + 1)[0]}
+    else:
+        def tail_at(name_end):
+            if next_nonspace[name_end] != n:
+                return None
+            return {}
+
+    tails = {}
+    next_good = [n] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        next_good[i] = next_good[i + 1]
+        if text[i] in _NAME_CHARS:
+            name_end = word_end[i]
+            if name_end not in tails:
+                tails[name_end] = tail_at(name_end)
+            if tails[name_end] is not None:
+                next_good[i] = i
+
+    first_newline = next_newline[0]
+    for pre_end in range(min(first_newline, n) + 1):
+        name_start = next_good[pre_end]
+        if name_start < module_end[pre_end]:
+            name_end = word_end[name_start]
+            res = {'pre': text[:pre_end],
+                   'module': text[pre_end:name_start],
+                   'name': text[name_start:name_end]}
+            res.update(tails[name_end])
+            return res
+
+    return None
 
 def codeitem_directive(dirname, arguments, options, content,
         lineno, content_offset, block_set, state, state_machine):
     if not content:
         content = [u""]
 
-    m = _CALLABLE_RE.match(u"".join(arguments))
-    m2 = _OTHER_RE.match(u"".join(arguments))
+    arguments = u"".join(arguments)
+    m = _split_signature(arguments, True)
+    m2 = m is None and _split_signature(arguments, False)
     if m:
-        g = m.groupdict()
+        g = m
         if g['rest'] is None:
             g['rest'] = ''
         if g['args'].strip():
@@ -224,7 +686,7 @@ def codeitem_directive(dirname, arguments, options, content,
         else:
             target = g['name']
     elif m2:
-        g = m2.groupdict()
+        g = m2
         firstline = "%s%s **%s**" % (g['pre'].replace('*', r'\*'),
                                      g['module'], g['name'])
         if g['module']:
@@ -232,7 +694,7 @@ def codeitem_directive(dirname, arguments, options, content,
         else:
             target = g['name']
     else:
-        firstline = u"".join(arguments)
+        firstline = arguments
         target = None
   
   
@@ -275,39 +737,116 @@ directives.register_directive('opcode', codeitem_directive)
 directives.register_directive('cmdoption', codeitem_directive)
 directives.register_directive('envvar', codeitem_directive)
 
+class RefResolver(object):
+    """Memoizes the links `ref_role` resolves.
+
+    Results are cached per (module, name) pair, including failed lookups,
+    which are common for external types, so the module-scoped candidates
+    only go through the link resolver the first time a name is met in a
+    module. Names added while scanning invalidate the cache once, when
+    the next reference is resolved. Every candidate is tried, the link resolver knows about the
+    symbols of the other extensions and projects, about plurals and
+    about the links its `get_link_signal` provides.
+
+    The symbols of the sources that were not scanned again are looked up
+    in the name table of the previous build, their links are created
+    from it without loading the symbols. Records of the other sources,
+    scanned again or no longer documented, are ignored.
+    """
+    def __init__(self):
+        self.__names = set()
+        self.__cache = {}
+        self.__cache_stale = False
+        self.__name_table = None
+        self.__unchanged_sources = frozenset()
+
+    def add_name(self, name):
+        self.__names.add(name)
+        self.__cache_stale = True
+
+    def set_name_table(self, name_table, unchanged_sources):
+        self.__name_table = name_table
+        self.__unchanged_sources = frozenset(unchanged_sources)
+        self.__cache.clear()
+
+    def get_unchanged_link(self, link_resolver, name):
+        """Returns the link to a symbol of a source that was not scanned
+        again, created from the name table, or None.
+        """
+        if self.__name_table is None or name in self.__names:
+            return None
+        record = self.__name_table.get(name)
+        if record is None or record[3] not in self.__unchanged_sources:
+            return None
+
+        # The link of a symbol that was loaded already wins
+        link_resolver.add_link(Link(record[1], record[0], name))
+        return link_resolver.get_named_link(name)
+
+    def resolve(self, link_resolver, cur_module, text):
+        if self.__cache_stale:
+            self.__cache_stale = False
+            self.__cache.clear()
+
+        key = (cur_module, text)
+        try:
+            return self.__cache[key]
+        except KeyError:
+            pass
+
+        link = self.__lookup(link_resolver, cur_module, text)
+        self.__cache[key] = link
+        return link
+
+    def __lookup(self, link_resolver, cur_module, text):
+        cur_module_components = cur_module.split('.') if cur_module else []
+
+        l = len(cur_module_components)
+        for i in range(l):
+            potential_name = '.'.join(cur_module_components[:l - i] + [text])
+            link = self.get_unchanged_link(link_resolver, potential_name)
+            if link:
+                return link
+            link = link_resolver.get_named_link(potential_name)
+            if link:
+                return link
+
+        return self.get_unchanged_link(link_resolver, text) or \
+                link_resolver.get_named_link(text)
+
 # This I think I understand, can't promise
 
+def _make_ref_node(link, text, link_resolver, options):
+    if link is None:
+        return nodes.emphasis(text, text)
+    return nodes.reference(link.title, link.title,
+            refuri=link.get_link(link_resolver), **options)
+
+# Documents rendered out of process can not resolve links, references are
+# replaced with placeholders and rendered once the fragment is used.
+_DEFERRED_REF_MARK = u'\ue000%d\ue001'
+_DEFERRED_REF_RE = re.compile(u'\ue000(\\d+)\ue001')
+
 def ref_role (name, raw_text, text, lineno, inliner,
         options=None, content=None):
-    link_resolver = inliner.document.settings.link_resolver
-    cur_module = inliner.document.settings.cur_module
-
-    cur_module_components = cur_module.split('.')
+    settings = inliner.document.settings
 
     if options is None:
         options = {}
     if content is None:
         content = []
 
-    link = None
+    deferred_refs = getattr(settings, 'deferred_refs', None)
+    if deferred_refs is not None:
+        deferred_refs.append((text, options))
+        mark = _DEFERRED_REF_MARK % (len(deferred_refs) - 1)
+        return [nodes.Text(mark, mark)], []
 
-    l = len(cur_module_components)
-    for i in range(l):
-        potential_name = '.'.join(cur_module_components[:l - i] + [text])
-        link = link_resolver.get_named_link(potential_name)
-        if link:
-            break
+    link_resolver = settings.link_resolver
+    link = settings.ref_resolver.resolve(link_resolver, settings.cur_module,
+            text)
 
-    if link is None:
-        link = link_resolver.get_named_link(text)
-
-    if link is None:
-        node = nodes.emphasis(text, text)
-    else:
-        node = nodes.reference(link.title, link.title, refuri=link.get_link(link_resolver),
-                **options)
-
-    return [node], []
+    return [_make_ref_node(link, text, link_resolver, options)], []
 
 roles.register_local_role('', ref_role)
 roles.register_local_role('func', ref_role)
@@ -326,16 +865,303 @@ roles.register_local_role('ctype', ref_role)
 roles.register_local_role('ref', ref_role)
 
 
+def _publish_fragment(text, writer, settings_overrides):
+    messages = []
+
+    def __collect_system_message(instance, level, message, *children,
+            **kwargs):
+        messages.append((message, kwargs.get('line')))
+
+    # Recent docutils versions drop the default role after each document
+    roles.register_local_role('', ref_role)
+
+    original_system_message = Reporter.system_message
+    Reporter.system_message = __collect_system_message
+    try:
+        parts = publish_parts(text, writer=writer,
+                settings_overrides=settings_overrides)
+    finally:
+        Reporter.system_message = original_system_message
+    return parts['fragment'], messages
+
+# Blocks that do not start the document must not be promoted to its
+# title or docinfo.
+_NESTED_OVERRIDES = {'doctitle_xform': False, 'docinfo_xform': False}
+
+_worker_writer = None
+
+def _render_in_worker(text, top):
+    global _worker_writer
+    if _worker_writer is None:
+        _worker_writer = HotdocRestHtmlWriter()
+    refs = []
+    overrides = {'deferred_refs': refs}
+    if not top:
+        overrides.update(_NESTED_OVERRIDES)
+    fragment, messages = _publish_fragment(text, _worker_writer, overrides)
+    return fragment, messages, refs
+
+def _worker_context():
+    # Workers may start while the scan threads hold locks, jedi's or the
+    # logging one, which forked children would inherit held forever
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def _render_batch_in_worker(modules):
+    results = []
+    durations = []
+    for _, keys in modules:
+        start = time.time()
+        for text, top in keys:
+            try:
+                results.append(_render_in_worker(text, top))
+            except Exception:
+                results.append(None)
+        durations.append(time.time() - start)
+    return results, durations
+
+
+class DocstringRenderer(object):
+    """Renders docstrings in a pool of worker processes.
+
+    Docstrings are submitted as soon as they are known, while scanning
+    or when formatting starts, and `MyRestParser` picks up the rendered
+    fragments. References can only be resolved once everything has been
+    scanned, and relative to the page being formatted, so workers leave
+    placeholders for them, which `MyRestParser` fills in.
+
+    Docstrings are grouped by module, and dispatched as one task per
+    batch of modules, the modules that took longest to render in the
+    previous builds first, so that no worker is left with a big module
+    at the end.
+    """
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.__futures = {}
+        self.__pending = {}
+        self.__batches = []
+        self.__executor = None
+
+    def start(self):
+        if self.__executor is None and self.jobs > 1:
+            self.__executor = ProcessPoolExecutor(max_workers=self.jobs,
+                    mp_context=_worker_context())
+
+    def submit(self, description, structured=False, source=None):
+        if self.__executor is None or not description:
+            return
+
+        text = unescape(description)
+        if not structured:
+            self.__submit(text, True, source)
+            return
+
+        for block in structured_blocks(text):
+            if isinstance(block, RestBlock):
+                self.__submit(block.text, block.top, source)
+
+    def __submit(self, text, top, source):
+        key = (text, top)
+        if u'\ue000' in text or key in self.__futures:
+            return
+
+        self.__futures[key] = None
+        self.__pending.setdefault(source or '', []).append(key)
+
+    def dispatch(self, timings, complete=True):
+        """Sends the docstrings submitted so far to the workers.
+
+        Args:
+            timings (scheduling.ModuleTimings): the render times of
+                the previous builds
+            complete (bool): whether all the docstrings were submitted,
+                if not the last batch is kept back when it is too small,
+                for the next modules to join it
+        """
+        if self.__executor is None or not self.__pending:
+            return
+
+        sizes = dict((source, sum(len(text) for text, _ in keys))
+                for source, keys in self.__pending.items())
+        batches = timings.schedule('render', sizes)
+        if not complete and sum(timings.estimate('render', source,
+                sizes[source]) for source in batches[-1]) < MIN_BATCH_SECONDS:
+            batches.pop()
+
+        for batch in batches:
+            modules = [(source, self.__pending.pop(source))
+                    for source in batch]
+            future = self.__executor.submit(_render_batch_in_worker, modules)
+            index = 0
+            for _, keys in modules:
+                for key in keys:
+                    self.__futures[key] = (future, index)
+                    index += 1
+            self.__batches.append((future,
+                [(source, sizes[source]) for source in batch]))
+
+    def record_timings(self, timings):
+        """Records the render time of the modules whose batches are
+        done.
+        """
+        totals = {}
+        batches = self.__batches
+        self.__batches = []
+        for future, modules in batches:
+            if not future.done():
+                self.__batches.append((future, modules))
+                continue
+            try:
+                durations = future.result()[1]
+            except Exception:
+                continue
+            for (source, size), seconds in zip(modules, durations):
+                total = totals.get(source, (0, 0))
+                totals[source] = (total[0] + seconds, total[1] + size)
+
+        for source, (seconds, size) in totals.items():
+            if source:
+                timings.record('render', source, seconds, size)
+
+    def get(self, text, top=True):
+        key = (text, top)
+        submitted = self.__futures.get(key)
+        if submitted is None:
+            return None
+
+        future, index = submitted
+        try:
+            return future.result()[0][index]
+        except Exception:
+            del self.__futures[key]
+            return None
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+
+
 class MyRestParser(object):
     def __init__(self, extension):
         self.extension = extension
         self.writer = HotdocRestHtmlWriter()
-        self.current_package_name = None
+        self.__translator = None
+        self.__labels = None
+
+    def __get_translator(self):
+        if self.__translator is None:
+            settings = OptionParser(
+                    components=(Parser, HotdocRestHtmlWriter)
+                    ).get_default_values()
+            document = new_document('<references>', settings)
+            self.__translator = self.writer.translator_class(document)
+            self.__labels = get_language(settings.language_code).labels
+        return self.__translator
+
+    def __render_node(self, node):
+        translator = self.__get_translator()
+        # Reference nodes must sit in a text element
+        paragraph = nodes.paragraph()
+        paragraph += node
+        translator.body = []
+        node.walkabout(translator)
+        return u''.join(translator.body)
+
+    def __make_block_node(self, block, link_resolver, cur_module):
+        if isinstance(block, Paragraph):
+            children = []
+            for inline in block.inlines:
+                if isinstance(inline, Reference):
+                    link = self.extension.ref_resolver.resolve(link_resolver,
+                            cur_module, inline.text)
+                    children.append(_make_ref_node(link, inline.text,
+                        link_resolver, {}))
+                elif isinstance(inline, Literal):
+                    children.append(nodes.literal(inline.text, inline.text))
+                else:
+                    children.append(nodes.Text(inline))
+            return nodes.paragraph('', '', *children)
+        elif isinstance(block, Rubric):
+            return nodes.rubric(block.text, block.text)
+        elif isinstance(block, CodeBlock):
+            if block.doctest:
+                return nodes.doctest_block(block.text, block.text)
+            return nodes.literal_block(block.text, block.text)
+
+        # Specific admonitions are written as generic ones
+        children = [self.__make_block_node(child, link_resolver, cur_module)
+                for child in block.blocks]
+        return nodes.admonition('',
+                nodes.title('', self.__labels[block.kind]), *children,
+                classes=[block.kind])
+
+    def __render_structured(self, text, link_resolver, cur_module):
+        fragments = []
+        messages = []
+        translator = self.__get_translator()
+        for block in structured_blocks(text):
+            if isinstance(block, RestBlock):
+                fragment, block_messages = self.__render_rest(block.text,
+                        block.top, link_resolver, cur_module)
+                fragments.append(fragment)
+                messages.extend((message, line if line is None else
+                    line + block.lineno) for message, line in block_messages)
+                continue
+
+            node = self.__make_block_node(block, link_resolver, cur_module)
+            node.parent = translator.document
+            translator.body = []
+            node.walkabout(translator)
+            fragments.append(u''.join(translator.body))
+
+        return u''.join(fragments), messages
+
+    def __render_rest(self, text, top, link_resolver, cur_module):
+        rendered = self.extension.renderer.get(text, top)
+        if rendered is None:
+            overrides = {'link_resolver': link_resolver,
+                         'ref_resolver': self.extension.ref_resolver,
+                         'cur_module': cur_module}
+            if not top:
+                overrides.update(_NESTED_OVERRIDES)
+            return _publish_fragment(text, self.writer, overrides)
+
+        fragment, messages, refs = rendered
+        if refs:
+            fragment = self.__resolve_deferred_refs(fragment, refs,
+                    link_resolver, cur_module)
+        return fragment, messages
+
+    def __resolve_deferred_refs(self, fragment, refs, link_resolver,
+            cur_module):
+        def __resolve(match):
+            text, options = refs[int(match.group(1))]
+            link = self.extension.ref_resolver.resolve(link_resolver,
+                    cur_module, text)
+            return self.__render_node(_make_ref_node(link, text,
+                link_resolver, options))
+
+        return _DEFERRED_REF_RE.sub(__resolve, fragment)
 
     def translate_comment(self, comment, link_resolver):
-        def __dummy_system_message(instance, level, message, *children, **kwargs):
-            if comment.lineno != -1 and 'line' in kwargs:
-                lineno = comment.lineno + kwargs.get('line')
+        text = unescape(comment.description)
+        if comment.filename:
+            cur_module = self.extension.get_module_name(comment.filename)
+        else:
+            cur_module = None
+
+        if self.extension.structured_docstrings:
+            fragment, messages = self.__render_structured(text,
+                    link_resolver, cur_module)
+        else:
+            fragment, messages = self.__render_rest(text, True,
+                    link_resolver, cur_module)
+
+        for message, line in messages:
+            if comment.lineno != -1 and line is not None:
+                lineno = comment.lineno + line
             else:
                 lineno = -1
 
@@ -345,14 +1171,7 @@ class MyRestParser(object):
                 filename=comment.filename,
                 lineno=lineno)
 
-        text = unescape(comment.description)
-        original_system_message = Reporter.system_message
-        Reporter.system_message = __dummy_system_message
-        parts = publish_parts(text, writer=self.writer,
-                settings_overrides={'link_resolver': link_resolver,
-                    'cur_module': self.current_package_name})
-        Reporter.system_message = original_system_message
-        return parts['fragment']
+        return fragment
 
     def parse_config(self, config):
         pass
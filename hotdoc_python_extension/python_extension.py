@@ -16,17 +16,25 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
-import os, glob, io
+import os, io, time, threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import pypandoc
 import jedi
 from jedi.evaluate.helpers import get_module_names
 
+from hotdoc.core.comment import Comment
 from hotdoc.core.extension import Extension
 from hotdoc.core.symbols import *
-from hotdoc.core.tree import Page
 
-from .python_doc_parser import google_doc_to_native
+from .python_doc_parser import (google_doc_to_native, RefResolver,
+        DocstringRenderer, type_expression_parts)
+from .class_graph import ClassGraph, base_expressions, module_imports
+from .search_index import SymbolSearchIndex, first_sentence
+from .inventory import InventoryIndex, write_inventory
+from .name_table import NameTable, write_name_table
+from .scheduling import ModuleTimings
 from .python_formatter import PythonFormatter
 
 
@@ -40,23 +48,162 @@ def get_definitions(script):
     return sorted(filter(def_ref_filter, defs), key=lambda x: (x.line,
         x.column))
 
+# jedi caches parsers process-wide, under the path of the script, and
+# evaluates its definitions lazily, they are only accessed with this held
+_jedi_lock = threading.Lock()
+
+def _defined_names(definition):
+    try:
+        return definition.defined_names()
+    except IndexError: # https://github.com/davidhalter/jedi/issues/697
+        return []
+
+def _class_bases(definition):
+    try:
+        arglist = definition._definition.get_super_arglist()
+    except AttributeError:
+        return []
+    if arglist is None:
+        return []
+    return base_expressions(arglist.get_code())
+
+def _self_attributes(definition):
+    for subdef in definition._definition.children:
+        if subdef.type != 'power':
+            continue
+        if len(subdef.children) != 2:
+            continue
+        if subdef.children[0].value != 'self':
+            continue
+        if subdef.children[1].type != 'trailer':
+            continue
+        attr = subdef.children[1]
+        if len(attr.children) != 2:
+            continue
+        if attr.children[0].type != 'operator' or \
+                attr.children[0].value != '.':
+            continue
+        short_name = str(attr.children[1].value)
+        if short_name.startswith('__'):
+            continue
+        yield short_name
+
+class _Definition(object):
+    """What the scanner uses of a jedi definition, copied with
+    `_jedi_lock` held so that modules can be parsed without it.
+    """
+    def __init__(self, definition, is_method=False):
+        self.name = str(definition.name)
+        self.type = definition.type
+        self.raw_doc = definition.raw_doc
+        self.line = definition.line
+        self.params = []
+        self.bases = []
+        self.members = []
+        self.attributes = []
+
+        if self.type == 'class':
+            self.bases = _class_bases(definition)
+            self.members = [_Definition(subdef, True)
+                    for subdef in _defined_names(definition)
+                    if subdef.type == 'function']
+        elif self.type == 'function':
+            self.params = [arg.name for arg in definition.params or []]
+            if is_method:
+                self.attributes = [short_name
+                        for subdef in _defined_names(definition)
+                        if subdef.type == 'statement'
+                        for short_name in _self_attributes(subdef)]
+
+def _set_filename(comment, filename):
+    comment.filename = filename
+    for param_comment in comment.params.values():
+        param_comment.filename = filename
+
+class _Docstring(object):
+    """A docstring of a scanned definition, parsed the first time it is
+    needed, which with lazy docstrings is when one of the symbols it
+    documents is resolved.
+    """
+    def __init__(self, raw_doc, name, filename, lineno):
+        self.raw_doc = raw_doc
+        self.name = name
+        self.filename = filename
+        self.lineno = lineno
+        self.__parsed = None
+
+    def parse(self):
+        if self.__parsed is None:
+            comment, attr_comments = google_doc_to_native(self.raw_doc)
+            if comment:
+                comment.lineno = self.lineno
+                _set_filename(comment, self.filename)
+                comment.name = self.name
+            self.__parsed = comment, attr_comments
+        return self.__parsed
+
+class _DeferredComment(Comment):
+    """Stands for the comment of a symbol until its docstring, kept as
+    the raw comment, is parsed. It is stored with the symbol when no page
+    resolved it.
+    """
+    pass
+
+class _ModuleScan(object):
+    """The state of the scan of a module, modules may be scanned
+    concurrently.
+    """
+    def __init__(self, filename, modname):
+        self.filename = filename
+        self.modname = modname
+        self.class_nesting = 0
+        self.class_members = []
+        self.seen_attrs = set()
+        self.lock_wait = 0
+
+    @contextmanager
+    def locked(self, lock):
+        """Holds `lock`, the time spent waiting for it is not part of the
+        time the module took to scan.
+        """
+        start = time.time()
+        with lock:
+            self.lock_wait += time.time() - start
+            yield
+
 class PythonScanner(object):
-    def __init__(self, app, project, extension, sources):
+    def __init__(self, app, project, extension):
         self.project = project
         self.app = app
 
-        self.class_nesting = 0
-
         self.fundamentals = self.__create_fundamentals()
 
         self.__extension = extension
-        self.mod_comments = {}
 
-        self.__seen_attrs = set()
+        # Guards the database and the state shared between modules
+        self.__lock = threading.RLock()
+        self.__interned_tokens = {}
+        self.__type_links = {}
+        self.__lazy = extension.lazy_docstrings
+        self.__classes = []
+
+    def scan(self, sources):
+        """Adds the symbols and comments of `sources` to the database."""
+        extension = self.__extension
+        # Docstrings are rendered in the order modules are scanned
+        timings = extension.timings
+        batches = timings.schedule('scan', dict((source,
+            os.path.getsize(source)) for source in sources))
+        if extension.scan_jobs > 1:
+            with ThreadPoolExecutor(max_workers=extension.scan_jobs) as pool:
+                for _ in pool.map(self.__scan_batch, batches):
+                    pass
+        else:
+            for batch in batches:
+                self.__scan_batch(batch)
+        extension.renderer.dispatch(timings)
 
-        for source in sources:
-            self.__current_filename = source
-            self.__parse_module (source)
+        self.__update_hierarchies()
 
     def __create_fundamentals(self):
         string_link = \
@@ -113,53 +260,151 @@ class PythonScanner(object):
 
         return fundamentals
 
-    def __parse_module(self, source):
-        relpath = os.path.relpath(source, self.__extension.package_root)
-        # FIXME: ahem
-        modname = os.path.splitext(relpath)[0].replace('/', '.')
+    def __scan_batch(self, sources):
+        timings = self.__extension.timings
+        for source in sources:
+            module = _ModuleScan(source,
+                    self.__extension.get_module_name(source))
+            start = time.time()
+            self.__parse_module(module)
+            seconds = time.time() - start - module.lock_wait
+            with self.__lock:
+                timings.record('scan', source, seconds,
+                        os.path.getsize(source))
+                self.__extension.renderer.dispatch(timings, complete=False)
+
+    def __parse_module(self, module):
+        source = module.filename
+        modname = module.modname
         with io.open(source, 'r', encoding='utf-8') as _:
-            source = _.read()
-        script = jedi.Script(source, line=1, column=0)
-        mod = script._parser.module()
-        modcomment, attribute_comments = google_doc_to_native(mod.raw_doc)
+            contents = _.read()
+        is_package = os.path.basename(source) == '__init__.py'
+        imports = module_imports(contents, modname, is_package)
+        with module.locked(self.__lock):
+            self.__extension.class_graph.add_module(modname, imports)
+        with module.locked(_jedi_lock):
+            script = jedi.Script(contents, line=1, column=0)
+            mod_doc = script._parser.module().raw_doc
+            defs = [_Definition(definition)
+                    for definition in get_definitions(script)]
+        modcomment, attribute_comments = google_doc_to_native(mod_doc)
 
         if modcomment:
             if modcomment.description:
                 out = pypandoc.convert(modcomment.description, to='md',
                                         format='rst')
                 modcomment.description = out
-                modcomment.name = relpath
-                self.app.database.add_comment(modcomment)
+                modcomment.name = os.path.relpath(source,
+                        self.__extension.package_root)
+                with module.locked(self.__lock):
+                    self.app.database.add_comment(modcomment)
 
-        defs = get_definitions(script)
         for definition in defs:
             if definition.type == 'class':
-                self.__parse_class(definition, modname)
+                self.__parse_class(module, definition, modname)
             elif definition.type == 'function':
-                self.__parse_function(definition, {}, modname)
+                self.__parse_function(module, definition, None, modname)
+
+    def __parse_class(self, module, definition, parent_name):
+        module.class_nesting += 1
+        klass_name = '.'.join((parent_name, definition.name))
+        docstring = _Docstring(definition.raw_doc, klass_name,
+                module.filename, definition.line + 1)
+        if self.__lazy:
+            comment = None
+        else:
+            comment = docstring.parse()[0]
+
+        module.class_members = []
+        for subdef in definition.members:
+            self.__parse_function(module, subdef, docstring, klass_name)
+
+        with module.locked(self.__lock):
+            self.__add_comment(comment)
+            class_symbol = self.__extension.get_or_create_symbol(ClassSymbol,
+                    filename=module.filename,
+                    display_name=klass_name)
+            if self.__lazy and definition.raw_doc:
+                self.__defer(class_symbol, docstring)
+            if class_symbol is not None:
+                self.__extension.class_graph.add_class(klass_name,
+                        module.modname, definition.bases,
+                        module.class_members)
+                self.__classes.append(class_symbol)
+        module.class_nesting -= 1
+
+    def __class_token(self, name):
+        return QualifiedSymbol(type_tokens=self.__type_tokens(name))
+
+    def __update_hierarchies(self):
+        graph = self.__extension.class_graph
+        graph.resolve()
+        for klass in self.__classes:
+            name = klass.unique_name
+            klass.hierarchy = [self.__class_token(base)
+                    for base in graph.get_ancestry(name)]
+            klass.children = {child: self.__class_token(child)
+                    for child in graph.get_children(name)}
+
+    def __defer(self, symbol, docstring):
+        # Still marks the pages using the symbol as stale in incremental
+        # builds, the placeholder is replaced when resolving
+        self.app.database.add_comment(_DeferredComment(
+            name=symbol.unique_name, filename=symbol.filename,
+            lineno=docstring.lineno, raw_comment=docstring.raw_doc))
+
+    def resolve_deferred(self, symbol):
+        """Parses the docstring of `symbol` if that was deferred, and
+        updates its comment and types. Symbols no page resolved keep
+        their docstring, a later build parses it when they are.
+        """
+        placeholder = symbol.comment
+        if not isinstance(placeholder, _DeferredComment):
+            return
 
-    def __parse_class(self, definition, parent_name):
-        self.class_nesting += 1
-        klass_name = '.'.join((parent_name, str(definition.name)))
-        comment, attr_comments = google_doc_to_native(definition.raw_doc)
+        symbol.comment = Comment(name=symbol.unique_name,
+                filename=symbol.filename)
+        if isinstance(symbol, PropertySymbol):
+            klass_name, _, attr_name = symbol.unique_name.rpartition('.')
+            docstring = _Docstring(placeholder.raw_comment, klass_name,
+                    symbol.filename, placeholder.lineno)
+            self.__resolve_property(symbol, docstring, attr_name)
+            return
+
+        docstring = _Docstring(placeholder.raw_comment, symbol.unique_name,
+                symbol.filename, placeholder.lineno)
+        if isinstance(symbol, FunctionSymbol):
+            self.__resolve_function(symbol, docstring)
+        else:
+            self.__resolve_class(symbol, docstring)
+
+    def __resolve_class(self, symbol, docstring):
+        comment = docstring.parse()[0]
         if comment:
-            comment.lineno = definition.line + 1
-            comment.filename = self.__current_filename
-            comment.name = klass_name
+            symbol.comment = comment
 
-        try:
-            subdefs = definition.defined_names()
-            for subdef in subdefs:
-                if subdef.type == 'function':
-                    self.__parse_function(subdef, attr_comments, klass_name)
-        except IndexError:
-            pass
+    def __resolve_property(self, symbol, klass_docstring, attr_name):
+        attr_comment = klass_docstring.parse()[1].get(attr_name)
+        if attr_comment is None:
+            return
+
+        attr_comment.name = symbol.unique_name
+        _set_filename(attr_comment, klass_docstring.filename)
+        symbol.prop_type = QualifiedSymbol(
+                type_tokens=self.__type_tokens_from_comment(attr_comment))
+        symbol.comment = attr_comment
 
+    def __resolve_function(self, symbol, docstring):
+        comment = docstring.parse()[0]
+        symbol.parameters = self.__parse_parameters(
+                [param.argname for param in symbol.parameters], comment)
+        symbol.return_value = self.__parse_return_value(comment)
+        symbol.comment = comment
+
+    def __add_comment(self, comment):
         self.app.database.add_comment(comment)
-        class_symbol = self.__extension.get_or_create_symbol(ClassSymbol,
-                filename=self.__current_filename,
-                display_name=klass_name)
-        self.class_nesting -= 1
+        if comment:
+            self.__extension.submit_comment(comment)
 
     def __type_tokens_from_comment(self, comment):
         if comment is None:
@@ -170,68 +415,79 @@ class PythonScanner(object):
         except KeyError:
             return []
 
+        return self.__type_tokens(pytype)
+
+    def __type_tokens(self, text):
+        # The same few types are named over and over, all the symbols
+        # naming one share its tokens, hotdoc only ever reads them.
         try:
-            link = self.fundamentals[pytype]
+            return self.__interned_tokens[text]
         except KeyError:
-            link = Link(None, pytype, pytype)
+            pass
 
-        return [link]
+        with self.__lock:
+            tokens = self.__interned_tokens.get(text)
+            if tokens is None:
+                tokens = self.__interned_tokens[text] = [
+                        self.__type_link(part) if is_name else part
+                        for part, is_name in type_expression_parts(text)]
+        return tokens
 
-    def __parse_attribute(self, definition, attr_comments, parent_name):
-        for subdef in definition._definition.children:
-            if subdef.type != 'power':
-                continue
-            if len(subdef.children) != 2:
-                continue
-            if subdef.children[0].value != 'self':
-                continue
-            if subdef.children[1].type != 'trailer':
-                continue
-            attr = subdef.children[1]
-            if len(attr.children) != 2:
-                continue
-            if attr.children[0].type != 'operator' or \
-                    attr.children[0].value != '.':
-                continue
-            attr_name = attr.children[1].value
-            if attr_name.startswith('__'):
-                continue
-            attr_comment = attr_comments.get(str(attr_name))
-            attr_name = '.'.join((parent_name, attr_name))
-            if attr_name in self.__seen_attrs:
-                continue
-            self.__seen_attrs.add(attr_name)
-            type_tokens = self.__type_tokens_from_comment(attr_comment)
+    def __type_link(self, name):
+        try:
+            return self.__type_links[name]
+        except KeyError:
+            pass
 
-            type_ = QualifiedSymbol(type_tokens=type_tokens)
+        link = self.__extension.inventory_index.get_link(name)
+        if link is None:
+            # Only used when no inventory documents the builtins
+            try:
+                link = self.fundamentals[name]
+            except KeyError:
+                link = self.__extension.ref_resolver.get_unchanged_link(
+                        self.app.link_resolver, name) or \
+                        Link(None, name, name)
+
+        self.__type_links[name] = link
+        return link
+
+    def __parse_attribute(self, module, short_name, klass_docstring,
+            parent_name):
+        attr_name = '.'.join((parent_name, short_name))
+        if attr_name in module.seen_attrs:
+            return
+        module.seen_attrs.add(attr_name)
+        module.class_members.append(short_name)
+        if self.__lazy:
+            attr_comment = None
+        else:
+            attr_comment = klass_docstring.parse()[1].get(short_name)
+        type_tokens = self.__type_tokens_from_comment(attr_comment)
 
-            if attr_comment:
-                attr_comment.name = attr_name
-                self.app.database.add_comment(attr_comment)
+        type_ = QualifiedSymbol(type_tokens=type_tokens)
 
-            self.__extension.get_or_create_symbol(PropertySymbol,
-                filename=self.__current_filename,
+        if attr_comment:
+            attr_comment.name = attr_name
+            _set_filename(attr_comment, module.filename)
+
+        with module.locked(self.__lock):
+            if attr_comment:
+                self.__add_comment(attr_comment)
+            prop_symbol = self.__extension.get_or_create_symbol(
+                PropertySymbol,
+                filename=module.filename,
                 display_name=attr_name,
                 prop_type=type_)
+            if self.__lazy and klass_docstring.raw_doc:
+                self.__defer(prop_symbol, klass_docstring)
 
-    def __params_doc_to_dict (self, params_doc):
-        dict_ = {}
-        for param in params_doc:
-            dict_[param[0]] = (param[1], param[2])
-
-        return dict_
-
-    def __parse_function(self, definition, klass_attr_comments, parent_name):
-        is_method = self.class_nesting > 0
-        if is_method:
-            try:
-                defs = definition.defined_names()
-            except IndexError: # https://github.com/davidhalter/jedi/issues/697
-                defs = []
-            for subdef in defs:
-                if subdef.type == 'statement':
-                    self.__parse_attribute(subdef, klass_attr_comments,
-                            parent_name)
+    def __parse_function(self, module, definition, klass_docstring,
+            parent_name):
+        is_method = module.class_nesting > 0
+        for short_name in definition.attributes:
+            self.__parse_attribute(module, short_name, klass_docstring,
+                    parent_name)
 
         name = definition.name
 
@@ -247,13 +503,13 @@ class PythonScanner(object):
             return
 
         func_name = str('.'.join((parent_name, name)))
+        docstring = None
+        comment = None
         if definition.raw_doc:
-            comment, attr_comments = google_doc_to_native(definition.raw_doc)
-            comment.lineno = definition.line + 1
-            comment.filename = self.__current_filename
-            comment.name = func_name
-        else:
-            comment = None
+            docstring = _Docstring(definition.raw_doc, func_name,
+                    module.filename, definition.line + 1)
+            if not self.__lazy:
+                comment = docstring.parse()[0]
 
         parameters = self.__parse_parameters(definition.params, comment)
         retval = self.__parse_return_value(comment)
@@ -261,15 +517,20 @@ class PythonScanner(object):
         if is_method:
             parameters = parameters[1:]
 
-        self.app.database.add_comment(comment)
-
-        func_symbol = self.__extension.get_or_create_symbol(FunctionSymbol,
-                parameters=parameters,
-                return_value=retval,
-                is_method = is_method,
-                filename=self.__current_filename,
-                is_ctor_for=is_ctor_for,
-                display_name=func_name)
+        with module.locked(self.__lock):
+            self.__add_comment(comment)
+            func_symbol = self.__extension.get_or_create_symbol(
+                    FunctionSymbol,
+                    parameters=parameters,
+                    return_value=retval,
+                    is_method = is_method,
+                    filename=module.filename,
+                    is_ctor_for=is_ctor_for,
+                    display_name=func_name)
+            if self.__lazy and docstring is not None:
+                self.__defer(func_symbol, docstring)
+        if is_method and is_ctor_for is None and func_symbol is not None:
+            module.class_members.append(str(name))
 
     def __parse_return_value(self, comment):
         if not comment:
@@ -285,7 +546,7 @@ class PythonScanner(object):
         except KeyError:
             return [None]
 
-    def __parse_parameters(self, args, comment):
+    def __parse_parameters(self, argnames, comment):
         parameters = []
 
         if comment:
@@ -293,17 +554,34 @@ class PythonScanner(object):
         else:
             param_comments = {}
 
-        for arg in args or []:
-            param_comment = param_comments.get (arg.name)
+        for argname in argnames:
+            param_comment = param_comments.get (argname)
             type_tokens = self.__type_tokens_from_comment(param_comment)
 
-            param = ParameterSymbol (argname=arg.name,
+            param = ParameterSymbol (argname=argname,
                     type_tokens=type_tokens)
             parameters.append (param)
 
         return parameters
 
 
+def _symbol_kind(symbol):
+    if isinstance(symbol, ClassSymbol):
+        return 'class'
+    elif isinstance(symbol, FunctionSymbol):
+        return 'method' if symbol.is_method else 'function'
+    elif isinstance(symbol, PropertySymbol):
+        return 'attribute'
+    return None
+
+
+def _search_entry(symbol):
+    summary = first_sentence(symbol.comment.description
+            if symbol.comment else None)
+    return (symbol.unique_name, symbol.link.ref,
+            _symbol_kind(symbol) or 'symbol', summary)
+
+
 DESCRIPTION=\
 """
 Parse python source files and extract symbols and comments.
@@ -317,22 +595,261 @@ class PythonExtension(Extension):
     def __init__(self, app, project):
         Extension.__init__(self, app, project)
         self.package_root = None
+        self.ref_resolver = RefResolver()
+        self.scanner = None
+        self.renderer = DocstringRenderer(0)
+        self.scan_jobs = 0
+        self.structured_docstrings = False
+        self.lazy_docstrings = False
+        self.search_index = None
+        self.inventories = []
+        self.inventory_urls = []
+        self.inventory_index = InventoryIndex(None)
+        self.name_table = NameTable(None)
+        self.timings = ModuleTimings(None)
+        self.class_graph = ClassGraph()
+        self.stale = []
+        self.__formatting = False
+        self.__formatted_symbols = []
+        self.__constructors = {}
+        self.__constructors_complete = False
+        self.__module_names = {}
 
     def setup(self):
         super(PythonExtension, self).setup()
+        self.project.formatted_signal.connect(self.__formatted_cb)
+        self.app.link_resolver.get_link_signal.connect(self.__get_link_cb)
+        # Symbols stored by previous builds may not be resolved yet
+        self.project.tree.resolving_symbol_signal.connect(
+                self.__resolving_symbol_cb)
+
         stale, unlisted = self.get_stale_files(self.sources)
         if not stale:
             return
 
         self.stale = stale
+        self.__constructors_complete = set(stale) == set(self.sources)
+
+        self.renderer.start()
+        self.__load_inventories()
+        self.__open_name_table()
+        self.__load_class_graph()
+        self.scanner = PythonScanner(self.app, self.project, self)
+        self.scanner.scan(stale)
+        self.class_graph.save(self.__get_class_graph_path())
+
+    def __load_inventories(self):
+        self.inventory_index = InventoryIndex(self.app.private_folder)
+        urls = self.inventory_urls
+        for i, path in enumerate(self.inventories or []):
+            self.inventory_index.load(path, urls[i] if i < len(urls) else None)
+
+    def __get_class_graph_path(self):
+        return os.path.join(self.app.private_folder,
+                'python-classes-%s.p' % self.project.sanitized_name)
+
+    def __load_class_graph(self):
+        # The classes of the modules that are not scanned again are still
+        # bases and children of the ones that are
+        stale = set(self.stale)
+        self.class_graph.load(self.__get_class_graph_path(),
+                [self.get_module_name(source) for source in self.sources
+                    if source not in stale])
+
+    def __get_name_table_path(self):
+        return os.path.join(self.app.private_folder,
+                'python-names-%s.tbl' % self.project.sanitized_name)
+
+    def __open_name_table(self):
+        self.name_table.close()
+        self.name_table = NameTable(self.__get_name_table_path())
+        stale = set(os.path.abspath(source) for source in self.stale)
+
+        # Sources may have changed during builds that did not write the
+        # table, which is then ignored
+        unchanged = [source for source in
+                (os.path.abspath(source) for source in self.sources)
+                if source not in stale]
+        if not self.name_table.covers(unchanged):
+            self.name_table.close()
+            return
+
+        self.ref_resolver.set_name_table(self.name_table, unchanged)
+
+    def __get_link_cb(self, link_resolver, name):
+        # Symbols of packages used to be named after their __init__ module
+        components = name.split('.')
+        if '__init__' not in components[1:]:
+            return None
+        components.remove('__init__')
+        return link_resolver.get_named_link('.'.join(components))
+
+    def __resolving_symbol_cb(self, page, symbol):
+        if not isinstance(symbol.comment, _DeferredComment):
+            return []
+
+        if self.scanner is None:
+            self.__load_inventories()
+            self.scanner = PythonScanner(self.app, self.project, self)
+        self.scanner.resolve_deferred(symbol)
+        return []
+
+    def submit_comment(self, comment):
+        self.renderer.submit(comment.description, self.structured_docstrings,
+                comment.filename)
+        for param_comment in comment.params.values():
+            self.renderer.submit(param_comment.description,
+                    self.structured_docstrings, comment.filename)
+
+    def __submit_stale_pages(self):
+        self.renderer.start()
+        for page in self.project.tree.walk():
+            if page.extension_name != self.extension_name:
+                continue
+            if not page.is_stale:
+                continue
+            for symbol in page.symbols:
+                if symbol.comment:
+                    self.submit_comment(symbol.comment)
+        self.renderer.dispatch(self.timings)
+        self.renderer.close()
+
+    def format_page(self, page, link_resolver, output):
+        # Pages are formatted one after the other, but we can already
+        # render the docstrings of all the pages in parallel.
+        if not self.__formatting:
+            self.__formatting = True
+            self.__submit_stale_pages()
+        super(PythonExtension, self).format_page(page, link_resolver, output)
+        if page.is_stale:
+            self.__formatted_symbols.extend(page.symbols)
+        if self.search_index is not None and page.is_stale:
+            self.search_index.update_source(page.source_file,
+                    [_search_entry(symbol) for symbol in page.symbols])
+
+    def __get_records(self, symbols):
+        for symbol in symbols:
+            if symbol.skip or symbol.link is None or not symbol.link.ref:
+                continue
+            yield (symbol.unique_name, symbol.link.title, symbol.link.ref,
+                    _symbol_kind(symbol), os.path.abspath(symbol.filename)
+                    if symbol.filename else None)
+
+    def __get_python_symbols(self):
+        # Symbols of the pages that were not formatted again are only
+        # in the database.
+        sources = set(os.path.abspath(source) for source in self.sources)
+        session = self.app.database.get_session()
+        for symbol in session.query(Symbol).filter(
+                Symbol.language == 'python'):
+            if symbol.filename in sources:
+                yield symbol
+
+    def __update_records(self, sources):
+        """Lists the records of the name table and the inventory, from
+        the symbols formatted in this build and the previous table.
+        """
+        records = list(self.__get_records(self.__formatted_symbols))
+        scanned = set(os.path.abspath(source) for source in self.stale)
+        unchanged = set(sources) - scanned
+        if not unchanged:
+            return records
+
+        previous = NameTable(self.__get_name_table_path())
+        try:
+            # The table is ignored if sources changed during builds that
+            # did not write it, all the symbols are loaded instead
+            if not previous.covers(unchanged):
+                return list(self.__get_records(self.__get_python_symbols()))
+
+            # Records of the symbols formatted again win
+            names = set(record[0] for record in records)
+            records.extend(record for record in previous
+                    if record[4] in unchanged and record[0] not in names)
+            return records
+        finally:
+            previous.close()
+
+    def __write_inventory(self, output, records):
+        # The links of subprojects are relative to the html root
+        prefix = ''
+        if not self.project.is_toplevel:
+            prefix = self.project.sanitized_name + '/'
+            output = os.path.join(output, self.project.sanitized_name)
+
+        entries = []
+        modules = {}
+        for name, _, ref, kind, source in records:
+            if kind is None:
+                continue
 
-        self.scanner = PythonScanner (self.app, self.project, self,
-                stale)
+            if prefix and ref.startswith(prefix):
+                ref = ref[len(prefix):]
+            entries.append((name, kind, ref))
+            former_name = self.get_former_name(name, source)
+            if former_name is not None:
+                entries.append((former_name, kind, ref))
+            modules.setdefault(self.get_module_name(source),
+                    ref.partition('#')[0])
+
+        entries.extend((modname, 'module', ref)
+                for modname, ref in modules.items())
+
+        if not os.path.exists(output):
+            os.makedirs(output)
+        write_inventory(os.path.join(output, 'objects.inv'),
+                self.project.project_name, self.project.project_version,
+                entries)
+
+    def __formatted_cb(self, project):
+        output = os.path.join(self.app.output, 'html')
+        sources = {}
+        for source in self.sources:
+            source = os.path.abspath(source)
+            try:
+                sources[source] = os.path.getmtime(source)
+            except OSError:
+                continue
+
+        records = self.__update_records(sources)
+        self.__formatted_symbols = []
+        self.__write_inventory(output, records)
+        # The table may be mapped still
+        self.name_table.close()
+        write_name_table(self.__get_name_table_path(), records, sources)
+        self.renderer.record_timings(self.timings)
+        self.timings.save()
+
+        if self.search_index is not None:
+            self.search_index.prune([page.source_file
+                for page in self.project.tree.walk()
+                if page.extension_name == self.extension_name])
+            # Subprojects have their own index
+            self.search_index.write(os.path.join(output, 'assets', 'js',
+                'python-search', self.project.sanitized_name))
+
+    def get_constructor(self, klass_name):
+        # Constructors of the classes we did not scan are looked up
+        # all at once, the first time they are needed.
+        if not self.__constructors_complete:
+            self.__constructors_complete = True
+            session = self.app.database.get_session()
+            for constructor in session.query(FunctionSymbol).filter(
+                    FunctionSymbol.is_ctor_for != None):
+                self.__constructors.setdefault(constructor.is_ctor_for,
+                        constructor)
+
+        return self.__constructors.get(klass_name)
 
     def get_or_create_symbol(self, *args, **kwargs):
         kwargs['language'] = 'python'
-        return super(PythonExtension, self).get_or_create_symbol(*args,
+        self.ref_resolver.add_name(kwargs.get('unique_name') or
+                kwargs.get('display_name'))
+        sym = super(PythonExtension, self).get_or_create_symbol(*args,
             **kwargs)
+        if sym is not None and kwargs.get('is_ctor_for') is not None:
+            self.__constructors[kwargs['is_ctor_for']] = sym
+        return sym
 
     @staticmethod
     def add_arguments (parser):
@@ -342,21 +859,97 @@ class PythonExtension(Extension):
         PythonExtension.add_sources_argument(group)
         PythonExtension.add_path_argument(group, 'package-root',
             help_="Path to the root of the documented package / application")
+        group.add_argument('--python-render-jobs', action='store',
+                dest='python_render_jobs', type=int, default=0,
+                help="Number of worker processes rendering docstrings while "
+                "sources are scanned and pages formatted, 0 or 1 to render "
+                "them serially")
+        group.add_argument('--python-scan-jobs', action='store',
+                dest='python_scan_jobs', type=int, default=0,
+                help="Number of threads scanning sources, 0 or 1 to scan "
+                "them serially. Parsing and database updates are "
+                "serialized, docstrings are parsed and converted in "
+                "parallel, on all cores with free-threaded python builds")
+        group.add_argument('--python-structured-docstrings',
+                action='store_true', dest='python_structured_docstrings',
+                help="Render paragraphs, admonitions, code blocks and "
+                "cross-references of docstrings directly, only passing "
+                "free-form rst to docutils")
+        group.add_argument('--python-lazy-docstrings',
+                action='store_true', dest='python_lazy_docstrings',
+                help="Parse docstrings when the symbols they document are "
+                "resolved instead of while scanning")
+        PythonExtension.add_paths_argument(group, 'inventories',
+            help_="Sphinx inventories (objects.inv) of the projects types "
+            "named in docstrings may link to, the first one documenting a "
+            "name wins")
+        group.add_argument('--python-inventory-urls', action='store',
+                nargs='+', dest='python_inventory_urls',
+                help="Urls of the documentations the inventories describe, "
+                "in the same order, inventories without an url are "
+                "skipped")
+        group.add_argument('--python-search-index',
+                action='store_true', dest='python_search_index',
+                help="Emit a search index of the python symbols, sharded by "
+                "name prefix, with the first sentence of their docstring, "
+                "in assets/js/python-search/<project>")
 
     def parse_config (self, config):
         super(PythonExtension, self).parse_config(config)
         if not self.package_root:
             self.package_root = os.path.commonprefix(self.sources)
         self.package_root = os.path.abspath(os.path.join(self.package_root, '..'))
+        self.renderer = DocstringRenderer(
+                int(config.get('python_render_jobs') or 0))
+        self.scan_jobs = int(config.get('python_scan_jobs') or 0)
+        self.structured_docstrings = bool(
+                config.get('python_structured_docstrings'))
+        self.lazy_docstrings = bool(config.get('python_lazy_docstrings'))
+        self.inventory_urls = config.get('python_inventory_urls') or []
+        self.timings = ModuleTimings(os.path.join(self.app.private_folder,
+            'python-timings-%s.p' % self.project.sanitized_name))
+        if config.get('python_search_index'):
+            self.search_index = SymbolSearchIndex(os.path.join(
+                self.app.private_folder,
+                'python-search-%s.p' % self.project.sanitized_name))
 
     def _get_smart_index_title(self):
         return 'Python API Reference'
 
-    def _get_naive_link_title(self, source_file):
-        relpath = os.path.relpath(source_file, self.package_root)
-        modname = os.path.splitext(relpath)[0].replace('/', '.')
+    def get_module_name(self, filename):
+        try:
+            return self.__module_names[filename]
+        except KeyError:
+            pass
+
+        modname = self.__get_module_path(filename)
+        if modname.endswith('.__init__'):
+            modname = modname[:-len('.__init__')]
+
+        self.__module_names[filename] = modname
         return modname
 
+    def __get_module_path(self, filename):
+        relpath = os.path.relpath(filename, self.package_root)
+        return os.path.splitext(relpath)[0].replace(os.sep, '.')
+
+    def get_former_name(self, name, filename):
+        """Returns the name a symbol of a package had when packages were
+        named after their `__init__` module, or None if it is the same.
+        """
+        if not filename or os.path.basename(filename) != '__init__.py':
+            return None
+
+        modname = self.get_module_name(filename)
+        former_modname = self.__get_module_path(filename)
+        if modname == former_modname or not (name == modname or
+                name.startswith(modname + '.')):
+            return None
+        return former_modname + name[len(modname):]
+
+    def _get_naive_link_title(self, source_file):
+        return self.get_module_name(source_file)
+
     def _make_formatter(self):
         return PythonFormatter(self)
 
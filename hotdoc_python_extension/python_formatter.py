@@ -18,7 +18,7 @@
 
 import os
 from hotdoc.core.formatter import Formatter
-from hotdoc.core.symbols import FunctionSymbol, Symbol
+from hotdoc.core.links import Link
 
 from .python_doc_parser import MyRestParser
 
@@ -28,10 +28,11 @@ class PythonFormatter(Formatter):
         searchpath = [os.path.join(module_path, "templates")]
         Formatter.__init__(self, extension, searchpath)
         self._docstring_formatter = MyRestParser(extension)
-        self.__current_module_name = None
+        self.__templates = {}
+        self.__shared_docs = {}
 
     def _format_prototype(self, function, is_pointer, title):
-        template = self.engine.get_template('python_prototype.html')
+        template = self.__templates['python_prototype.html']
 
         res = template.render ({'function_name': title,
             'parameters': function.parameters,
@@ -44,7 +45,7 @@ class PythonFormatter(Formatter):
     # pylint: disable=too-many-arguments
     def _format_callable_summary(self, callable_, return_value, function_name,
                                  is_callable, is_pointer):
-        template = self.engine.get_template('callable_summary.html')
+        template = self.__templates['callable_summary.html']
 
         return template.render({'symbol': callable_,
                                 'return_value': [],
@@ -52,44 +53,114 @@ class PythonFormatter(Formatter):
                                 'is_callable': is_callable,
                                 'is_pointer': is_pointer})
 
+    def _format_symbol(self, symbol):
+        out, standalone = Formatter._format_symbol(self, symbol)
+        # Keeps the anchors of the names package symbols used to have
+        former_name = self.extension.get_former_name(symbol.unique_name,
+                symbol.filename)
+        if out and former_name is not None:
+            out = u'<span id="%s"></span>%s' % (former_name, out)
+        return out, standalone
+
     def _format_function(self, func):
         if func.is_ctor_for is not None:
             return None, None
         return super(PythonFormatter, self)._format_function(func)
 
+    def _format_type_tokens(self, type_tokens):
+        # Type expressions such as "dict(str, Bar)" keep the spacing and
+        # punctuation of the docstring.
+        out = ''
+        for tok in type_tokens:
+            if isinstance(tok, Link):
+                ref = tok.get_link(self.extension.app.link_resolver)
+                if ref:
+                    out += self._format_link(ref, tok.title)
+                else:
+                    out += tok.title
+            else:
+                out += tok
+        return out
+
     def _format_parameter_symbol (self, parameter):
         if parameter.type_tokens:
             parameter.extension_contents['type-link'] = \
                     self._format_type_tokens(parameter.type_tokens)
         return Formatter._format_parameter_symbol(self, parameter)
 
-    def _format_class_symbol(self, klass):
-        constructor = self.extension.app.database.get_session().query(FunctionSymbol).filter(
-                FunctionSymbol.is_ctor_for==klass.unique_name).first()
-        if constructor is None:
-            return Formatter._format_class_symbol(self, klass)
+    def _format_comment(self, comment, link_resolver):
+        # Members of classes with subclasses are listed again on the
+        # pages of the subclasses, their comment is only translated once
+        # per folder as links are relative to the page.
+        owner = comment.name.rpartition('.')[0] if comment.name else None
+        if not owner or not self.extension.class_graph.get_children(owner):
+            return Formatter._format_comment(self, comment, link_resolver)
 
-        hierarchy = self._format_hierarchy(klass)
-        template = self.engine.get_template('python_class.html')
+        page = self._current_page
+        key = (comment.name,
+                os.path.dirname(page.build_path) if page else None)
+        try:
+            return self.__shared_docs[key]
+        except KeyError:
+            pass
 
+        out = Formatter._format_comment(self, comment, link_resolver)
+        self.__shared_docs[key] = out
+        return out
+
+    def __format_inherited(self, klass):
+        database = self.extension.app.database
         link_resolver = self.extension.app.link_resolver
-        self.format_symbol(constructor, link_resolver)
-        constructor.link.title = klass.display_name
-        constructor = self._format_callable(constructor, 'class',
-                klass.link.title)[0]
+        template = self.__templates['python_inherited.html']
+
+        # The symbols and comments of the base classes are shared, not
+        # copied into the subclass.
+        inherited = []
+        for owner, members in self.extension.class_graph.get_inherited_members(
+                klass.unique_name):
+            details = []
+            for member in members:
+                symbol = database.get_symbol('%s.%s' % (owner, member))
+                if symbol is None or symbol.skip:
+                    continue
+                details.append((self._format_linked_symbol(symbol),
+                    self.format_comment(symbol.comment, link_resolver)))
+
+            if details:
+                owner_symbol = database.get_symbol(owner)
+                if owner_symbol is not None:
+                    owner = self._format_linked_symbol(owner_symbol)
+                inherited.append((owner, details))
+
+        if not inherited:
+            return None
+
+        return template.render({'inherited': inherited})
+
+    def _format_class_symbol(self, klass):
+        hierarchy = self._format_hierarchy(klass)
+        inherited = self.__format_inherited(klass)
+        template = self.__templates['python_class.html']
+
+        constructor = self.extension.get_constructor(klass.unique_name)
+        if constructor is not None:
+            link_resolver = self.extension.app.link_resolver
+            self.format_symbol(constructor, link_resolver)
+            constructor.link.title = klass.display_name
+            constructor = self._format_callable(constructor, 'class',
+                    klass.link.title)[0]
+
         return (template.render({'symbol': klass,
                                  'klass': klass,
                                  'constructor': constructor,
-                                 'hierarchy': hierarchy}),
+                                 'hierarchy': hierarchy,
+                                 'inherited': inherited}),
                 False)
 
-    def format_symbol(self, symbol, link_resolver):
-        if isinstance(symbol, Symbol):
-            if self.__current_module_name != symbol.filename:
-                self.__current_module_name = symbol.filename
-                relpath = os.path.relpath(self.__current_module_name,
-                        self.extension.package_root)
-                modname = os.path.splitext(relpath)[0].replace('/', '.')
-                self._docstring_formatter.current_package_name = modname
-
-        return Formatter.format_symbol(self, symbol, link_resolver)
+    def parse_config(self, config):
+        Formatter.parse_config(self, config)
+        # The engine only exists once configured, load the templates we use
+        # for every symbol now rather than looking them up each time.
+        for name in ('python_prototype.html', 'callable_summary.html',
+                'python_class.html', 'python_inherited.html'):
+            self.__templates[name] = self.engine.get_template(name)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import pickle
+
+_TIMINGS_VERSION = 1
+
+# Seconds per unit of size when no module was timed yet, docutils renders
+# about 100 kB of docstrings per second
+_DEFAULT_RATE = 1e-5
+
+# Small modules are grouped until a batch is expected to take that long,
+# dispatching a task to a worker costs in the order of a millisecond
+MIN_BATCH_SECONDS = 0.02
+
+class ModuleTimings(object):
+    """The time each phase of the work, scanning or rendering, took for
+    each module in the previous builds, to schedule the longest modules
+    first.
+
+    Modules that were not timed yet are estimated from their size, with
+    the rate observed on the other modules for the same phase.
+    """
+    def __init__(self, path):
+        self.__path = path
+        self.__timings = {}
+        self.__rates = {}
+        self.__load()
+
+    def __load(self):
+        if self.__path is None:
+            return
+
+        try:
+            with open(self.__path, 'rb') as _:
+                state = pickle.load(_)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return
+
+        if state.get('version') == _TIMINGS_VERSION:
+            self.__timings = state['timings']
+
+    def record(self, phase, source, seconds, size):
+        """Records the time a phase took for a module.
+
+        Args:
+            phase (str): 'scan' or 'render'
+            source (str): the module
+            seconds (float): the time it took
+            size (int): the size of what was processed, the length of
+                the source for scanning, of the docstrings for rendering
+        """
+        self.__timings.setdefault(phase, {})[source] = (seconds, size)
+        self.__rates.pop(phase, None)
+
+    def __get_rate(self, phase):
+        try:
+            return self.__rates[phase]
+        except KeyError:
+            pass
+
+        timings = self.__timings.get(phase, {}).values()
+        total_size = sum(size for _, size in timings)
+        rate = _DEFAULT_RATE
+        if total_size:
+            rate = sum(seconds for seconds, _ in timings) / total_size
+        self.__rates[phase] = rate
+        return rate
+
+    def estimate(self, phase, source, size):
+        """Estimates the time a phase will take for a module, in seconds.
+
+        The previous duration is scaled when the module changed size.
+        """
+        try:
+            seconds, previous_size = self.__timings[phase][source]
+        except KeyError:
+            return size * self.__get_rate(phase)
+
+        if previous_size and size != previous_size:
+            return seconds * size / previous_size
+        return seconds
+
+    def schedule(self, phase, sizes, min_batch_seconds=MIN_BATCH_SECONDS):
+        """Orders modules longest first and batches the small ones.
+
+        Args:
+            phase (str): 'scan' or 'render'
+            sizes (dict): modules to the size of what is to be processed
+            min_batch_seconds (float): the time under which modules are
+                grouped with others
+
+        Returns:
+            list: lists of modules, each list to be processed as a single
+                task, the longest tasks first
+        """
+        estimates = dict((source, self.estimate(phase, source, size))
+                for source, size in sizes.items())
+        batches = []
+        batch = []
+        batch_seconds = 0
+        for source in sorted(estimates, key=lambda s: (-estimates[s], s)):
+            batch.append(source)
+            batch_seconds += estimates[source]
+            if batch_seconds >= min_batch_seconds:
+                batches.append(batch)
+                batch = []
+                batch_seconds = 0
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def save(self):
+        if self.__path is None:
+            return
+
+        with open(self.__path, 'wb') as _:
+            pickle.dump({'version': _TIMINGS_VERSION,
+                'timings': self.__timings}, _, pickle.HIGHEST_PROTOCOL)
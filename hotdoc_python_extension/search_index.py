@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import json
+import os
+import pickle
+import re
+from collections import OrderedDict
+
+# Shards holding more entries than this are split on a longer prefix
+_SHARD_MAX_ENTRIES = 500
+_SUMMARY_MAX_LENGTH = 160
+_INDEX_VERSION = 1
+
+_MARKUP_RE = re.compile(r':[\w.:-]+:(?=`)|`+|\|(?=\w)|(?<=\w)\|')
+_EMPHASIS_RE = re.compile(r'(\*{1,2})(\S(?:.*?\S)?)\1')
+_SENTENCE_END_RE = re.compile(r'[.!?](?=\s+[A-Z]|$)')
+
+def first_sentence(text):
+    """Extracts a plain text summary from a docstring, its first sentence
+    with the inline markup stripped.
+    """
+    if not text:
+        return ''
+
+    paragraph = text.strip().split('\n\n', 1)[0]
+    paragraph = _EMPHASIS_RE.sub(r'\2', _MARKUP_RE.sub('', paragraph))
+    paragraph = ' '.join(paragraph.split())
+    match = _SENTENCE_END_RE.search(paragraph)
+    if match:
+        paragraph = paragraph[:match.end()]
+    if len(paragraph) > _SUMMARY_MAX_LENGTH:
+        paragraph = paragraph[:_SUMMARY_MAX_LENGTH - 1].rstrip() + u'…'
+    return paragraph
+
+def _name_tokens(name):
+    # Indexing the package and module components too would put every
+    # symbol in the shards of its parents, queries on those are
+    # answered by the parents' own entries.
+    short_name = name.rpartition('.')[2].lower()
+    tokens = set([short_name])
+    words = short_name.split('_')
+    for i in range(1, len(words)):
+        suffix = '_'.join(words[i:])
+        if suffix:
+            tokens.add(suffix)
+    return tokens
+
+
+class SymbolSearchIndex(object):
+    """A prefix-sharded inverted index of symbol names.
+
+    The name of a symbol, and the parts of that name that follow an
+    underscore, point to the symbol. Words are sharded by their first
+    characters, shards growing too large are split on a longer prefix.
+    Each shard holds the entries it refers to, so that a client only
+    downloads the shard of the longest prefix of the query it is
+    completing, and filters those on their qualified names.
+
+    The index is persisted between builds and updated for the changed
+    sources only, shards are only written again when their contents
+    change.
+    """
+    def __init__(self, path):
+        self.__path = path
+        self.__sources = {}
+        self.__entries = {}
+        self.__postings = {}
+        self.__layout = {}
+        self.__touched = set()
+        self.__load()
+
+    def __load(self):
+        try:
+            with open(self.__path, 'rb') as _:
+                state = pickle.load(_)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return
+
+        if state.get('version') != _INDEX_VERSION:
+            return
+
+        self.__sources = state['sources']
+        self.__entries = state['entries']
+        self.__postings = state['postings']
+        self.__layout = state['layout']
+
+    def __remove_source(self, source):
+        for name in self.__sources.pop(source, ()):
+            self.__entries.pop(name, None)
+            for token in _name_tokens(name):
+                names = self.__postings.get(token)
+                if names is None:
+                    continue
+                names.discard(name)
+                if not names:
+                    del self.__postings[token]
+                self.__touched.add(token)
+
+    def update_source(self, source, entries):
+        """Replaces the entries of a source file.
+
+        Args:
+            source (str): the source file, or the page documenting it
+            entries (list): (name, ref, kind, summary) tuples
+        """
+        entries = list(OrderedDict((entry[0], tuple(entry))
+            for entry in entries).values())
+        old_entries = [self.__entries.get(name)
+                for name in self.__sources.get(source, ())]
+        if old_entries == entries:
+            return
+
+        self.__remove_source(source)
+        self.__sources[source] = [entry[0] for entry in entries]
+        for entry in entries:
+            name = entry[0]
+            self.__entries[name] = entry
+            for token in _name_tokens(name):
+                self.__postings.setdefault(token, set()).add(name)
+                self.__touched.add(token)
+
+    def prune(self, sources):
+        """Drops the entries of the sources not listed in `sources`."""
+        sources = set(sources)
+        for source in list(self.__sources):
+            if source not in sources:
+                self.__remove_source(source)
+
+    def __partition(self):
+        groups = {}
+        for token in self.__postings:
+            groups.setdefault(token[0], []).append(token)
+
+        layout = {}
+        pending = list(groups.items())
+        while pending:
+            prefix, tokens = pending.pop()
+            size = sum(len(self.__postings[token]) for token in tokens)
+            if size <= _SHARD_MAX_ENTRIES:
+                layout[prefix] = tuple(sorted(tokens))
+                continue
+
+            # The token equal to the prefix can not be split further
+            subgroups = {}
+            for token in tokens:
+                if token == prefix:
+                    layout[prefix] = (token,)
+                else:
+                    subgroups.setdefault(token[:len(prefix) + 1],
+                            []).append(token)
+            pending.extend(subgroups.items())
+
+        return layout
+
+    def __write_shard(self, output, key, tokens):
+        names = sorted(set().union(*(self.__postings[token]
+            for token in tokens)))
+        indices = {name: i for i, name in enumerate(names)}
+        contents = {
+            'symbols': [self.__entries[name] for name in names],
+            'tokens': {token: sorted(indices[name]
+                for name in self.__postings[token]) for token in tokens},
+        }
+        self.__write_js(os.path.join(output, '%s.js' % key),
+                'python_search_shard_downloaded_cb(%s, %s);' % (json.dumps(key),
+                    json.dumps(contents, separators=(',', ':'),
+                        sort_keys=True)))
+
+    def __write_js(self, path, contents):
+        with io.open(path, 'w', encoding='utf-8') as _:
+            _.write(contents)
+
+    def write(self, output):
+        """Writes the shards that changed since the last build to `output`,
+        along with the list of shards, and persists the index.
+        """
+        manifest = os.path.join(output, 'index.js')
+        complete = os.path.exists(manifest)
+        if complete and not self.__touched:
+            return
+
+        if not os.path.exists(output):
+            os.makedirs(output)
+
+        layout = self.__partition()
+        for key, tokens in layout.items():
+            # Rewritten when the output was cleaned up too
+            if not complete or self.__layout.get(key) != tokens or \
+                    self.__touched.intersection(tokens):
+                self.__write_shard(output, key, tokens)
+
+        for key in self.__layout:
+            if key not in layout:
+                path = os.path.join(output, '%s.js' % key)
+                if os.path.exists(path):
+                    os.unlink(path)
+
+        self.__write_js(manifest, 'python_search_index_downloaded_cb(%s);' %
+                json.dumps({'shards': sorted(layout)}, separators=(',', ':')))
+
+        self.__layout = layout
+        self.__touched = set()
+        with open(self.__path, 'wb') as _:
+            pickle.dump({'version': _INDEX_VERSION,
+                'sources': self.__sources,
+                'entries': self.__entries,
+                'postings': self.__postings,
+                'layout': self.__layout}, _, pickle.HIGHEST_PROTOCOL)
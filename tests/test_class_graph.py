@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from hotdoc_python_extension.class_graph import (ClassGraph,
+        base_expressions, module_imports)
+
+
+def _diamond():
+    """pkg.base.Base <- pkg.shapes.{Left, Right} <- pkg.shapes.Bottom, with
+    Base re-exported by the package."""
+    graph = ClassGraph()
+    graph.add_module('pkg', {'Base': 'pkg.base.Base'})
+    graph.add_module('pkg.base', {})
+    graph.add_module('pkg.shapes', {'pkg': 'pkg'})
+    graph.add_class('pkg.base.Base', 'pkg.base', ['object'],
+            ['area', 'name'])
+    graph.add_class('pkg.shapes.Left', 'pkg.shapes', ['pkg.Base'], ['area'])
+    graph.add_class('pkg.shapes.Right', 'pkg.shapes', ['pkg.Base'],
+            ['draw'])
+    graph.add_class('pkg.shapes.Bottom', 'pkg.shapes', ['Left', 'Right'],
+            [])
+    graph.resolve()
+    return graph
+
+
+class TestParsing(unittest.TestCase):
+    def test_base_expressions(self):
+        self.assertEqual(base_expressions('Base, mod.Other, '
+            'Generic[T], metaclass=Meta'), ['Base', 'mod.Other', 'Generic'])
+        self.assertEqual(base_expressions('not python ('), [])
+
+    def test_module_imports(self):
+        contents = '\n'.join(['import os.path',
+            'import numpy as np',
+            'from . import shapes',
+            'from .base import Base as Root',
+            'from ..other import *',
+            'try:',
+            '    from json import loads',
+            'except ImportError:',
+            '    loads = None'])
+        self.assertEqual(module_imports(contents, 'pkg.sub.mod', False), {
+            'os': 'os', 'np': 'numpy', 'shapes': 'pkg.sub.shapes',
+            'Root': 'pkg.sub.base.Base', 'loads': 'json.loads'})
+        self.assertEqual(module_imports('from . import mod', 'pkg', True),
+                {'mod': 'pkg.mod'})
+        self.assertEqual(module_imports('def (', 'pkg', True), {})
+
+
+class TestClassGraph(unittest.TestCase):
+    def test_bases_are_resolved(self):
+        graph = _diamond()
+        self.assertTrue(graph.is_class('pkg.shapes.Left'))
+        self.assertFalse(graph.is_class('object'))
+        # Through the package re-exporting Base
+        self.assertEqual(graph.get_bases('pkg.shapes.Left'),
+                ['pkg.base.Base'])
+        self.assertEqual(graph.get_bases('pkg.shapes.Bottom'),
+                ['pkg.shapes.Left', 'pkg.shapes.Right'])
+        self.assertEqual(sorted(graph.get_children('pkg.base.Base')),
+                ['pkg.shapes.Left', 'pkg.shapes.Right'])
+        self.assertEqual(sorted(graph.get_descendants('pkg.base.Base')),
+                ['pkg.shapes.Bottom', 'pkg.shapes.Left', 'pkg.shapes.Right'])
+
+    def test_ancestry(self):
+        graph = _diamond()
+        self.assertEqual(graph.get_ancestry('pkg.shapes.Bottom'),
+                ('object', 'pkg.base.Base', 'pkg.shapes.Left'))
+        self.assertEqual(graph.get_ancestry('pkg.shapes.Left'),
+                ('object', 'pkg.base.Base'))
+        self.assertEqual(graph.get_ancestry('object'), ())
+
+    def test_mro_matches_python(self):
+        class Base(object):
+            pass
+
+        class Left(Base):
+            pass
+
+        class Right(Base):
+            pass
+
+        class Bottom(Left, Right):
+            pass
+
+        names = {object: 'object', Base: 'pkg.base.Base',
+                Left: 'pkg.shapes.Left', Right: 'pkg.shapes.Right',
+                Bottom: 'pkg.shapes.Bottom'}
+        self.assertEqual(_diamond().get_mro('pkg.shapes.Bottom'),
+                tuple(names[klass] for klass in Bottom.__mro__))
+
+    def test_deep_hierarchy(self):
+        graph = ClassGraph()
+        graph.add_module('mod', {})
+        graph.add_class('mod.C0', 'mod', [])
+        for i in range(1, 2000):
+            graph.add_class('mod.C%d' % i, 'mod', ['C%d' % (i - 1)])
+        graph.resolve()
+        self.assertEqual(len(graph.get_mro('mod.C1999')), 2000)
+        self.assertEqual(len(graph.get_ancestry('mod.C1999')), 1999)
+
+    def test_inherited_members(self):
+        graph = _diamond()
+        self.assertEqual(graph.get_inherited_members('pkg.shapes.Bottom'), [
+            ('pkg.shapes.Left', ['area']),
+            ('pkg.shapes.Right', ['draw']),
+            ('pkg.base.Base', ['name'])])
+        self.assertEqual(graph.get_inherited_members('pkg.base.Base'), [])
+
+
+class TestPersistence(unittest.TestCase):
+    def setUp(self):
+        self.__dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.__dir, 'classes.p')
+
+    def tearDown(self):
+        shutil.rmtree(self.__dir, ignore_errors=True)
+
+    def test_unchanged_modules_are_loaded(self):
+        _diamond().save(self.path)
+
+        # pkg.shapes is scanned again, Bottom was removed from it
+        graph = ClassGraph()
+        graph.load(self.path, ['pkg', 'pkg.base'])
+        graph.add_module('pkg.shapes', {})
+        graph.add_class('pkg.shapes.Left', 'pkg.shapes', ['Base'])
+        graph.add_module('pkg.shapes', {'Base': 'pkg.Base'})
+        graph.resolve()
+
+        self.assertFalse(graph.is_class('pkg.shapes.Bottom'))
+        self.assertEqual(graph.get_members('pkg.base.Base'),
+                ('area', 'name'))
+        self.assertEqual(graph.get_mro('pkg.shapes.Left'),
+                ('pkg.shapes.Left', 'pkg.base.Base', 'object'))
+
+    def test_other_versions_are_ignored(self):
+        with open(self.path, 'wb') as _:
+            pickle.dump({'version': 0, 'imports': {},
+                'classes': {'mod.A': ('mod', [], ())}}, _)
+        graph = ClassGraph()
+        graph.load(self.path, ['mod'])
+        graph.load(os.path.join(self.__dir, 'missing.p'), ['mod'])
+        self.assertFalse(graph.is_class('mod.A'))
+
+
+if __name__ == '__main__':
+    unittest.main()
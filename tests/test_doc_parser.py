@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import inspect
+import json
+import os
+import unittest
+from unittest import mock
+
+from hotdoc_python_extension.python_doc_parser import (MyGoogleDocString,
+        _doc_style, _doc_styles, _parse_doc, config, google_doc_to_native,
+        trim, type_expression_parts)
+
+
+# Google style docstrings using most of what napoleon supports
+GOOGLE_DOCS = [
+u'''Fetches rows from a table.
+
+Retrieves the rows pertaining to the given keys, with a longer
+explanation spanning
+two lines.
+
+Args:
+    table (Table): An open table instance.
+    keys: A sequence of strings, the keys of the rows to fetch.
+        Continued on an indented line.
+
+        Note:
+            Keys are case sensitive.
+    *args: Variable arguments.
+    **kwargs (dict): Keyword arguments.
+
+Returns:
+    dict: A dict mapping keys to the corresponding table row
+    data fetched.
+
+Raises:
+    IOError: An error occurred accessing the table.''',
+u'''A class.
+
+Attributes:
+    likes_spam (bool): Whether we like spam.
+    eggs: int, The number of eggs we have laid.
+
+Example:
+    Examples should be written in doctest format::
+
+        >>> print([i for i in range(3)])
+        [0, 1, 2]
+
+Note:
+    A note about the class.
+
+Args:
+This is not a section, the next line is not indented.''',
+u'''Generates values.
+
+    An indented paragraph.
+
+Yields:
+    int: The next value.
+
+.. note::
+
+   A directive, not a section.
+
+See Also:
+    other_function''',
+]
+
+# What the napoleon parser gave for GOOGLE_DOCS before it used a table of
+# the lines: the lines, and the parameter, attribute and return fields
+GOOGLE_EXPECTED = [
+    ([u'Fetches rows from a table.',
+      u'',
+      u'Retrieves the rows pertaining to the given keys, with a longer',
+      u'explanation spanning',
+      u'two lines.',
+      u'',
+      u':raises: :exc:`IOError` -- An error occurred accessing the table.',
+      u''],
+     [(u'table', u'Table', [u'An open table instance.']),
+      (u'keys', u'',
+       [u'A sequence of strings, the keys of the rows to fetch.',
+        u'Continued on an indented line.',
+        u'',
+        u'.. note:: Keys are case sensitive.',
+        u'']),
+      (u'\\*args', u'', [u'Variable arguments.']),
+      (u'\\*\\*kwargs', u'dict', [u'Keyword arguments.', u''])],
+     [],
+     [(u'', u'dict', [u'A dict mapping keys to the corresponding table row']),
+      (u'', u'data fetched.', [u'', u''])]),
+    ([u'A class.',
+      u'',
+      u'.. rubric:: Example',
+      u'',
+      u'Examples should be written in doctest format::',
+      u'',
+      u'    >>> print([i for i in range(3)])',
+      u'    [0, 1, 2]',
+      u'',
+      u'.. note:: A note about the class.',
+      u'',
+      u'Args:',
+      u'This is not a section, the next line is not indented.'],
+     [],
+     [(u'likes_spam', u'bool', [u'Whether we like spam.']),
+      (u'eggs', u'int', [u'The number of eggs we have laid.', u''])],
+     []),
+    ([u'Generates values.',
+      u'',
+      u'    An indented paragraph.',
+      u'',
+      u':Yields: *int* -- The next value.',
+      u'',
+      u'.. note::',
+      u'',
+      u'   A directive, not a section.',
+      u'',
+      u'.. seealso:: other_function',
+      u''],
+     [],
+     [],
+     []),
+]
+
+
+def _stdlib_docstrings():
+    docs = []
+    for module in (collections, inspect, json, os, unittest):
+        for _, obj in inspect.getmembers(module):
+            doc = getattr(obj, '__doc__', None)
+            if isinstance(doc, str) and doc.strip():
+                docs.append(doc)
+    return docs
+
+
+class TestSectionDetection(unittest.TestCase):
+    def test_fast_path_matches_napoleon(self):
+        # Docstrings without a section header are left as they are by
+        # napoleon, they are not handed to it
+        docs = _stdlib_docstrings()
+        skipped = 0
+        for doc in docs:
+            doc = trim(doc)
+            if _doc_style(doc.split('\n')) is not None:
+                continue
+            skipped += 1
+            parsed = MyGoogleDocString(doc, config)
+            self.assertEqual(parsed.__unicode__(), doc)
+            self.assertEqual(parsed.param_fields, [])
+            self.assertEqual(parsed.attribute_fields, [])
+            self.assertEqual(parsed.return_fields, [])
+
+        # Most docstrings have no section
+        self.assertGreater(skipped, len(docs) * 0.5)
+
+    def test_headers_are_detected(self):
+        self.assertEqual(_doc_style([u'Summary.', u'', u'Args:',
+            u'    x (int): a value']), 'google')
+        self.assertEqual(_doc_style([u'Summary.', u'', u'Note: not a header',
+            u'Arguments are words']), None)
+        self.assertEqual(_doc_style([u'Summary.', u'---------']), None)
+        self.assertEqual(_doc_style([u'Summary.', u'', u'Parameters',
+            u'----------', u'x : int']), 'numpy')
+
+    def test_directives_do_not_select_numpy(self):
+        self.assertEqual(_doc_style([u'Summary.', u'', u'.. index:: foo',
+            u'', u'Args:', u'    x (int): a value', u'', u'Returns:',
+            u'    str: the result']), 'google')
+        self.assertEqual(_doc_style([u'Summary.', u'', u'.. index:: foo']),
+                None)
+
+
+class TestMixedStyles(unittest.TestCase):
+    def test_styles_are_listed_in_order(self):
+        lines = [u'Summary.', u'', u'Parameters', u'----------', u'x : int',
+                u'', u'Returns:', u'    str: the result']
+        self.assertEqual(_doc_styles(lines), ['numpy', 'google'])
+        self.assertEqual(_doc_style(lines), 'numpy')
+        self.assertEqual(_doc_styles(lines[6:] + lines[:6]),
+                ['google', 'numpy'])
+
+    def test_google_then_numpy(self):
+        _, description, params, attributes, returns = _parse_doc(
+            u'Summary.\n\nArgs:\n    x (int): the x\n\n'
+            u'Returns\n-------\nstr\n    the result\n')
+        self.assertEqual(description, u'Summary.\n')
+        self.assertEqual([field[:2] for field in params], [(u'x', u'int')])
+        self.assertEqual([field[:2] for field in returns], [(u'', u'str')])
+
+    def test_numpy_then_google(self):
+        _, description, params, attributes, returns = _parse_doc(
+            u'Summary.\n\nParameters\n----------\nx : int\n    the x\n\n'
+            u'Attributes:\n    name (str): the name\n')
+        self.assertEqual(description, u'Summary.\n')
+        self.assertEqual([field[:2] for field in params], [(u'x', u'int')])
+        self.assertEqual([field[:2] for field in attributes],
+                [(u'name', u'str')])
+
+    def test_single_style_is_parsed_once(self):
+        doc = GOOGLE_DOCS[2] + u'\n\nOnly parsed once.'
+        CountingDocString.instances = 0
+        CountingDocString(doc, config)
+        direct = CountingDocString.instances
+
+        CountingDocString.instances = 0
+        with mock.patch(
+                'hotdoc_python_extension.python_doc_parser.MyGoogleDocString',
+                CountingDocString):
+            _parse_doc(doc)
+        self.assertEqual(CountingDocString.instances, direct)
+
+
+class CountingDocString(MyGoogleDocString):
+    """Counts the docstrings parsed, nested ones included."""
+    instances = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingDocString.instances += 1
+        MyGoogleDocString.__init__(self, *args, **kwargs)
+
+
+class AlwaysNestedDocString(MyGoogleDocString):
+    """Parses every field description, as napoleon does."""
+    def _parse_field_description(self, lines):
+        return self.__class__(lines, self._config).lines()
+
+
+def _parsed(cls, doc):
+    parsed = cls(doc, config)
+    return (parsed.lines(), parsed.param_fields, parsed.attribute_fields,
+            parsed.return_fields)
+
+
+class TestFieldDescriptions(unittest.TestCase):
+    def test_same_output_as_parsing_every_description(self):
+        for doc in GOOGLE_DOCS + [trim(doc) for doc in _stdlib_docstrings()]:
+            self.assertEqual(_parsed(MyGoogleDocString, doc),
+                    _parsed(AlwaysNestedDocString, doc))
+
+    def test_only_descriptions_with_sections_are_parsed(self):
+        CountingDocString.instances = 0
+        CountingDocString(u'\n'.join([u'Summary.', u'', u'Args:'] +
+            [u'    arg%d (int): value %d' % (i, i) for i in range(20)]),
+            config)
+        self.assertEqual(CountingDocString.instances, 1)
+
+        # The description of "keys" has a note
+        CountingDocString.instances = 0
+        CountingDocString(GOOGLE_DOCS[0], config)
+        self.assertEqual(CountingDocString.instances, 2)
+
+
+class TestLineTable(unittest.TestCase):
+    def test_output_is_unchanged(self):
+        for doc, expected in zip(GOOGLE_DOCS, GOOGLE_EXPECTED):
+            self.assertEqual(_parsed(MyGoogleDocString, doc), expected)
+
+    def test_line_table(self):
+        parsed = MyGoogleDocString([u'Summary.', u'', u'Args:',
+            u'    x (int): a', u'', u'        more', u'Returns:'], config)
+        self.assertEqual(parsed._line_blank,
+                [False, True, False, False, True, False, False])
+        self.assertEqual(parsed._line_indent, [0, 0, 0, 4, 0, 8, 0])
+        # "Returns:" is not followed by an indented line, it is still
+        # named like a section
+        self.assertEqual(parsed._line_header,
+                [False, False, True, False, False, False, True])
+        self.assertEqual(parsed._next_indent, [0, 0, 0, 4, 8, 8, 0, 0])
+
+
+class TestParseMemo(unittest.TestCase):
+    def test_identical_docstrings_are_parsed_once(self):
+        doc = GOOGLE_DOCS[0] + u'\n\nUnique to this test.'
+        misses = _parse_doc.cache_info().misses
+        first = google_doc_to_native(doc)[0]
+        second = google_doc_to_native(u'    ' + doc)[0]
+        self.assertEqual(_parse_doc.cache_info().misses, misses + 2)
+        google_doc_to_native(doc)
+        self.assertEqual(_parse_doc.cache_info().misses, misses + 2)
+        self.assertEqual(first.description, second.description)
+
+    def test_comments_are_not_shared(self):
+        doc = GOOGLE_DOCS[0]
+        first, _ = google_doc_to_native(doc)
+        # The scanner consumes the tags of the comments
+        first.tags.pop('returns')
+        first.params['table'].tags.pop('type')
+        second, _ = google_doc_to_native(doc)
+        self.assertIsNot(first, second)
+        self.assertEqual(len(second.tags['returns']), 2)
+        self.assertEqual(second.params['table'].tags['type'], u'Table')
+
+
+class TestTypeExpressions(unittest.TestCase):
+    def test_compound_types(self):
+        self.assertEqual(type_expression_parts(u'dict(str, Bar)'),
+                ((u'dict', True), (u'(', False), (u'str', True),
+                 (u', ', False), (u'Bar', True), (u')', False)))
+        self.assertEqual(type_expression_parts(u'Optional[pkg.Baz]'),
+                ((u'Optional', True), (u'[', False), (u'pkg.Baz', True),
+                 (u']', False)))
+        self.assertEqual(type_expression_parts(u''), ())
+
+    def test_words_and_literals_are_text(self):
+        self.assertEqual(type_expression_parts(u'list of Foo, optional'),
+                ((u'list', True), (u' of ', False), (u'Foo', True),
+                 (u', optional', False)))
+        self.assertEqual(type_expression_parts(u'"a" or \'b\''),
+                ((u'"a" or \'b\'', False),))
+
+    def test_references_are_stripped(self):
+        self.assertEqual(type_expression_parts(u':class:`~foo.Bar`'),
+                ((u'foo.Bar', True),))
+        self.assertEqual(type_expression_parts(u':class:`Foo <pkg.Foo>`'
+            u' or None'), ((u'pkg.Foo', True), (u' or ', False),
+                (u'None', True)))
+
+    def test_descriptions_are_parsed_once(self):
+        text = u'tuple(int, Unique)'
+        misses = type_expression_parts.cache_info().misses
+        first = type_expression_parts(text)
+        self.assertIs(type_expression_parts(text), first)
+        self.assertEqual(type_expression_parts.cache_info().misses,
+                misses + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
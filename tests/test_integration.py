@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    from hotdoc.run_hotdoc import run
+    from hotdoc.utils.loggable import Logger
+    from hotdoc_python_extension import python_extension
+    from hotdoc_python_extension.inventory import read_inventory
+except ImportError:
+    run = None
+
+PACKAGE = {
+    '__init__.py': '''"""The package.
+
+See :class:`shapes.Shape`.
+"""
+
+def draw(shape):
+    """Draws a shape."""
+''',
+    'shapes.py': '''"""Shapes to draw.
+
+Example::
+
+    square = Square(2)
+"""
+
+class Shape(object):
+    """A shape.
+
+    .. note::
+
+       Shapes are immutable, see :func:`make_shape`, and draw them
+       with :func:`pkg.__init__.draw`.
+
+    Attributes:
+        name (str): the name of the shape
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def area(self):
+        """Computes the area.
+
+        Returns:
+            float: the area, see :class:`Square`
+        """
+        return 0.0
+
+
+class Square(Shape):
+    """A square, a *regular* `Shape`.
+
+    Args:
+        side (int): the length of a side
+    """
+    def __init__(self, side):
+        Shape.__init__(self, 'square')
+        self.side = side
+
+    def area(self):
+        return float(self.side * self.side)
+
+
+def make_shape(name, sides=4):
+    """Makes a shape.
+
+    Parameters
+    ----------
+    name : str
+        The name of the shape
+    sides : int, optional
+        The number of sides
+
+    Returns
+    -------
+    Shape
+        The new shape
+    """
+    return Shape(name)
+''',
+    'sub/__init__.py': '''"""Shapes in a subpackage."""
+''',
+    'sub/circles.py': '''"""Round shapes, their page is in another folder."""
+
+from pkg.shapes import Shape
+
+
+class Circle(Shape):
+    """A circle."""
+''',
+}
+
+
+class BuildTestCase(unittest.TestCase):
+    """Writes `PACKAGE` to a temporary folder, and builds it with
+    `build`.
+    """
+    def setUp(self):
+        self.__cwd = os.getcwd()
+        self.__dir = tempfile.mkdtemp()
+        os.chdir(self.__dir)
+        self.sources = []
+        for name, contents in PACKAGE.items():
+            path = os.path.join(self.__dir, 'pkg', name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as _:
+                _.write(contents)
+            self.sources.append(path)
+        with open('index.markdown', 'w') as _:
+            _.write('# Shapes\n')
+        with open('sitemap.txt', 'w') as _:
+            _.write('index.markdown\n\tpython-index\n')
+
+    def tearDown(self):
+        os.chdir(self.__cwd)
+        shutil.rmtree(self.__dir, ignore_errors=True)
+
+    def build(self, *options, clean=True):
+        """Builds the package, returns the html pages by path."""
+        if clean:
+            for name in os.listdir('.'):
+                if name == 'out' or name.startswith('hotdoc-private'):
+                    shutil.rmtree(name)
+        Logger.reset()
+        Logger.silent = True
+
+        args = ['--index', 'index.markdown',
+                '--sitemap', 'sitemap.txt',
+                '--output', 'out',
+                '--project-name', 'shapes',
+                '--project-version', '0.1',
+                '--python-smart-index',
+                '--python-sources'] + self.sources + list(options) + ['run']
+        self.assertEqual(run(args), 0)
+
+        pages = {}
+        html = os.path.join('out', 'html')
+        for folder, dirnames, filenames in os.walk(html):
+            dirnames[:] = [name for name in dirnames if name != 'assets']
+            for name in filenames:
+                if name.endswith('.html'):
+                    path = os.path.join(folder, name)
+                    with open(path) as _:
+                        pages[os.path.relpath(path, html)] = _.read()
+        return pages
+
+    def page_path(self, pages, name):
+        """The path of the page generated for the module `name`, the
+        shallowest one for packages."""
+        paths = [path for path in pages
+                if os.path.splitext(os.path.basename(path))[0] == name]
+        if not paths:
+            self.fail('No page for %s in %s' % (name, sorted(pages)))
+        return min(paths, key=lambda path: path.count(os.sep))
+
+    def page(self, pages, name):
+        """The page generated for the module `name`."""
+        return pages[self.page_path(pages, name)]
+
+
+@unittest.skipIf(run is None, 'requires the hotdoc build environment')
+class TestRenderJobs(BuildTestCase):
+    def test_render_jobs_do_not_change_the_output(self):
+        for options in ([], ['--python-structured-docstrings']):
+            serial = self.build('--python-render-jobs', '1', *options)
+            parallel = self.build('--python-render-jobs', '2', *options)
+            self.assertTrue(serial)
+            self.assertEqual(sorted(parallel), sorted(serial))
+            for name, contents in serial.items():
+                self.assertEqual(parallel[name], contents, name)
+
+
+@unittest.skipIf(run is None, 'requires the hotdoc build environment')
+class TestBuild(BuildTestCase):
+    def test_constructors_are_listed_with_their_class(self):
+        shapes = self.page(self.build(), 'shapes')
+        self.assertIn('(name)', shapes)
+        self.assertIn('(side)', shapes)
+
+    def test_package_symbols_keep_their_former_names(self):
+        pages = self.build()
+        # Symbols of packages used to be named after their __init__ module
+        package = self.page(pages, '__init__')
+        self.assertIn('id="pkg.draw"', package)
+        self.assertIn('id="pkg.__init__.draw"', package)
+        self.assertRegex(self.page(pages, 'shapes'),
+                r'href="[^"]*#pkg\.draw"')
+
+        objects = read_inventory(os.path.join('out', 'html', 'objects.inv'))
+        self.assertEqual(objects['pkg.__init__.draw'], objects['pkg.draw'])
+
+    def test_type_names_are_shared(self):
+        parsed = []
+        looked_up = []
+        parts = python_extension.type_expression_parts
+        get_link = python_extension.InventoryIndex.get_link
+
+        def __parts(text):
+            parsed.append(text)
+            return parts(text)
+
+        def __get_link(index, name):
+            looked_up.append(name)
+            return get_link(index, name)
+
+        with mock.patch.object(python_extension, 'type_expression_parts',
+                __parts), mock.patch.object(python_extension.InventoryIndex,
+                'get_link', __get_link):
+            self.build()
+
+        # "str" and "int" type several parameters and attributes, their
+        # tokens and links are built once
+        self.assertIn('str', parsed)
+        self.assertEqual(len(parsed), len(set(parsed)))
+        self.assertIn('str', looked_up)
+        self.assertIn('int', looked_up)
+        self.assertEqual(len(looked_up), len(set(looked_up)))
+
+    def test_inventory_links_to_the_pages(self):
+        pages = self.build()
+        objects = read_inventory(os.path.join('out', 'html', 'objects.inv'))
+        self.assertEqual(objects['pkg.shapes.Shape'][0], 'class')
+        self.assertEqual(objects['pkg.shapes.Shape.area'][0], 'method')
+        self.assertEqual(objects['pkg.shapes.make_shape'][0], 'function')
+        self.assertEqual(objects['pkg.shapes'][0], 'module')
+        for name, (role, uri) in objects.items():
+            self.assertIn(uri.partition('#')[0], pages, name)
+
+    def test_unchanged_sources_stay_in_the_inventory(self):
+        self.build()
+        shapes = [path for path in self.sources
+                if os.path.basename(path) == 'shapes.py'][0]
+        with open(shapes, 'a') as _:
+            _.write('\n\ndef erase(shape):\n    """Erases a shape."""\n')
+        self.build(clean=False)
+
+        objects = read_inventory(os.path.join('out', 'html', 'objects.inv'))
+        self.assertEqual(objects['pkg.shapes.erase'][0], 'function')
+        self.assertEqual(objects['pkg.shapes.Shape'][0], 'class')
+        # From the name table of the previous build
+        self.assertEqual(objects['pkg.sub.circles.Circle'][0], 'class')
+        self.assertEqual(objects['pkg.draw'], objects['pkg.__init__.draw'])
+
+    def test_inherited_comments_link_from_every_folder(self):
+        pages = self.build()
+        circles = self.page_path(pages, 'circles')
+        shapes = self.page_path(pages, 'shapes')
+        self.assertNotEqual(os.path.dirname(circles), os.path.dirname(shapes))
+
+        # The comment of Shape.area links to Square, and is listed again
+        # on the page of Circle
+        self.assertIn('Computes the area', pages[circles])
+        linked_from = []
+        for path, contents in pages.items():
+            for ref in re.findall(r'href="([^"#]*)#pkg\.shapes\.Square"',
+                    contents):
+                target = os.path.normpath(os.path.join(
+                    os.path.dirname(path), ref))
+                self.assertIn(target, pages, path)
+                linked_from.append(path)
+        self.assertIn(circles, linked_from)
+        self.assertIn(shapes, linked_from)
+
+
+@unittest.skipIf(run is None, 'requires the hotdoc build environment')
+class TestLazyDocstrings(BuildTestCase):
+    def build_counting(self, clean=True):
+        """Builds with lazy docstrings, returns the pages and the names of
+        the docstrings parsed."""
+        parsed = []
+        parse = python_extension._Docstring.parse
+
+        def __parse(docstring):
+            parsed.append(docstring.name)
+            return parse(docstring)
+
+        with mock.patch.object(python_extension._Docstring, 'parse',
+                __parse):
+            pages = self.build('--python-lazy-docstrings', clean=clean)
+        return pages, parsed
+
+    def list_no_python_page(self):
+        with open('sitemap.txt', 'w') as _:
+            _.write('index.markdown\n')
+
+    def test_symbols_not_rendered_are_not_parsed(self):
+        self.list_no_python_page()
+        _, parsed = self.build_counting()
+        self.assertEqual(parsed, [])
+
+    def test_rendered_symbols_are_parsed(self):
+        pages, parsed = self.build_counting()
+        self.assertIn('pkg.shapes.Shape', parsed)
+        self.assertIn('Computes the area', self.page(pages, 'shapes'))
+
+    def test_stored_symbols_are_parsed_when_rendered(self):
+        self.list_no_python_page()
+        self.build_counting()
+        with open('sitemap.txt', 'w') as _:
+            _.write('index.markdown\n\tpython-index\n')
+        pages, _ = self.build_counting(clean=False)
+        self.assertIn('Computes the area', self.page(pages, 'shapes'))
+
+
+if __name__ == '__main__':
+    unittest.main()
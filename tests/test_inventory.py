@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+from hotdoc_python_extension import inventory
+from hotdoc_python_extension.inventory import (InventoryIndex,
+        read_inventory, write_inventory)
+
+ENTRIES = [
+    ('pkg.shapes.Shape', 'class', 'pkg/shapes.html#pkg.shapes.Shape'),
+    ('pkg.shapes.Shape.area', 'method',
+        'pkg/shapes.html#pkg.shapes.Shape.area'),
+    ('pkg.shapes.make_shape', 'function', 'pkg/shapes.html#make'),
+    ('pkg.shapes', 'module', 'pkg/shapes.html'),
+]
+
+
+class InventoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'objects.inv')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write_lines(self, lines, header=b'# Sphinx inventory version 2\n'):
+        with open(self.path, 'wb') as _:
+            _.write(header)
+            _.write(b'# Project: other\n# Version: 1.0\n')
+            _.write(b'# The remainder of this file is compressed using '
+                    b'zlib.\n')
+            _.write(zlib.compress(u'\n'.join(lines).encode('utf-8')))
+
+
+class TestInventoryFiles(InventoryTestCase):
+    def test_round_trip(self):
+        write_inventory(self.path, 'shapes', '0.1', ENTRIES)
+        self.assertEqual(read_inventory(self.path), dict(
+            (name, (role, uri)) for name, role, uri in ENTRIES))
+
+        with open(self.path, 'rb') as _:
+            header = [_.readline() for i in range(4)]
+            lines = zlib.decompress(_.read()).decode('utf-8').splitlines()
+        self.assertEqual(header[1:3], [b'# Project: shapes\n',
+            b'# Version: 0.1\n'])
+        # Sorted by name, anchors repeating the name are abbreviated
+        self.assertEqual(lines[:2], [
+            u'pkg.shapes py:module 1 pkg/shapes.html -',
+            u'pkg.shapes.Shape py:class 1 pkg/shapes.html#$ -'])
+
+    def test_first_role_wins(self):
+        self.write_lines([
+            u'os.path py:module 0 library/os.path.html -',
+            u'Shape py:function 1 api.html#$ -',
+            u'Shape py:class 1 api.html#Shape-class -',
+            u'Shape std:label -1 api.html#shapes Shapes',
+            u'with spaces py:data 1 api.html#$ Display name',
+            u'not an entry'])
+        self.assertEqual(read_inventory(self.path), {
+            'os.path': ('module', 'library/os.path.html'),
+            'Shape': ('class', 'api.html#Shape-class'),
+            'with spaces': ('data', 'api.html#with spaces'),
+        })
+
+    def test_first_entry_for_a_name_wins(self):
+        # A former name may be the name of another symbol
+        write_inventory(self.path, 'shapes', '0.1', [
+            ('pkg.draw', 'method', 'pkg.html#draw'),
+            ('pkg.draw', 'function', 'other.html#draw'),
+            ('pkg', 'module', 'pkg.html')])
+        self.assertEqual(read_inventory(self.path), {
+            'pkg': ('module', 'pkg.html'),
+            'pkg.draw': ('method', 'pkg.html#draw')})
+
+    def test_other_files_are_refused(self):
+        self.write_lines([], header=b'# Sphinx inventory version 1\n')
+        self.assertRaises(ValueError, read_inventory, self.path)
+        with open(self.path, 'wb') as _:
+            _.write(b'# Sphinx inventory version 2\n\n\n\nnot zlib')
+        self.assertRaises(ValueError, read_inventory, self.path)
+
+
+class TestInventoryIndex(InventoryTestCase):
+    def setUp(self):
+        InventoryTestCase.setUp(self)
+        self.write_lines([
+            u'str py:class 1 library/stdtypes.html#$ -',
+            u'collections.OrderedDict py:class 1 library/collections.html#$ -',
+            u'a.Node py:class 1 a.html#$ -',
+            u'b.Node py:class 1 b.html#$ -'])
+
+    def test_links(self):
+        index = InventoryIndex(self.folder)
+        index.load(self.path, 'https://docs.python.org/3/')
+        self.assertEqual(index.get_link('string').ref,
+                'https://docs.python.org/3/library/stdtypes.html#str')
+        link = index.get_link('OrderedDict')
+        self.assertEqual(link.title, 'collections.OrderedDict')
+        self.assertEqual(link.ref, 'https://docs.python.org/3/'
+                'library/collections.html#collections.OrderedDict')
+        # Ambiguous short names are not linked
+        self.assertIsNone(index.get_link('Node'))
+        self.assertIsNone(index.get_link('Missing'))
+
+    def test_first_inventory_wins(self):
+        other = os.path.join(self.folder, 'other.inv')
+        write_inventory(other, 'other', '1', [('str', 'class', 'str.html')])
+        index = InventoryIndex(self.folder)
+        index.load(other, 'https://other.org')
+        index.load(self.path, 'https://docs.python.org/3/')
+        self.assertEqual(index.get_link('str').ref,
+                'https://other.org/str.html')
+
+    def test_inventories_without_url_are_skipped(self):
+        index = InventoryIndex(self.folder)
+        with mock.patch.object(inventory, 'warn') as warn:
+            index.load(self.path, None)
+            index.load(os.path.join(self.folder, 'missing.inv'),
+                    'https://docs.python.org/3/')
+        self.assertEqual([call[0][0] for call in warn.call_args_list],
+                ['python-inventory-issue', 'python-inventory-issue'])
+        self.assertIsNone(index.get_link('str'))
+
+    def test_parsed_inventories_are_cached(self):
+        InventoryIndex(self.folder).load(self.path, 'https://a.org')
+        with mock.patch.object(inventory, 'read_inventory') as read:
+            index = InventoryIndex(self.folder)
+            index.load(self.path, 'https://a.org')
+        self.assertFalse(read.called)
+        self.assertEqual(index.get_link('str').ref,
+                'https://a.org/library/stdtypes.html#str')
+
+
+if __name__ == '__main__':
+    unittest.main()
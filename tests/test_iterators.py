@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+from unittest import mock
+
+from hotdoc_python_extension.napoleon import docstring
+from hotdoc_python_extension.napoleon.iterators import (modify_iter,
+        peek_cursor)
+from hotdoc_python_extension.python_doc_parser import (MyGoogleDocString,
+        config)
+
+
+def _call(iterator, operation, n):
+    try:
+        result = getattr(iterator, operation)(n) if operation != 'has_next' \
+                else iterator.has_next()
+    except StopIteration:
+        return 'stop'
+    # Each iterator has its own sentinel
+    if result is iterator.sentinel:
+        return 'sentinel'
+    if isinstance(result, list):
+        return ['sentinel' if item is iterator.sentinel else item
+                for item in result]
+    return result
+
+
+class CountingCursor(peek_cursor):
+    """Counts the lines the parser moves over or peeks at."""
+    reads = 0
+
+    def has_next(self):
+        CountingCursor.reads += 1
+        return peek_cursor.has_next(self)
+
+    def next(self, n=None):
+        CountingCursor.reads += n or 1
+        return peek_cursor.next(self, n)
+
+    def peek(self, n=None):
+        CountingCursor.reads += n or 1
+        return peek_cursor.peek(self, n)
+
+
+def _parse_reads(lines):
+    doc = u'\n'.join([u'Summary.', u'', u'Attributes:'] +
+            [u'    attr%d (int): value %d' % (i, i) for i in range(lines)])
+    CountingCursor.reads = 0
+    with mock.patch.object(docstring, 'peek_cursor', CountingCursor):
+        parsed = MyGoogleDocString(doc, config)
+    assert len(parsed.attribute_fields) == lines
+    return CountingCursor.reads
+
+
+class TestPeekCursor(unittest.TestCase):
+    def test_matches_modify_iter(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            items = [u' %d ' % i for i in range(rng.randint(0, 8))]
+            reference = modify_iter(items, modifier=lambda s: s.strip())
+            cursor = peek_cursor(items, modifier=lambda s: s.strip())
+            for _ in range(12):
+                operation = rng.choice(['next', 'peek', 'has_next'])
+                n = rng.choice([None, 0, 1, 2, 3])
+                self.assertEqual(_call(cursor, operation, n),
+                        _call(reference, operation, n))
+
+    def test_parsing_scales_linearly(self):
+        # Quadratic behaviour would make the ratio 64
+        small = _parse_reads(500)
+        large = _parse_reads(4000)
+        self.assertLess(large, small * 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hotdoc_python_extension.name_table import NameTable, write_name_table
+
+
+class TestNameTable(unittest.TestCase):
+    def setUp(self):
+        self.__dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.__dir, 'names.tbl')
+        self.sources = {}
+        for name in ('a.py', 'b.py'):
+            source = os.path.join(self.__dir, name)
+            with open(source, 'w') as _:
+                _.write('')
+            self.sources[source] = os.path.getmtime(source)
+        self.a, self.b = sorted(self.sources)
+        self.entries = [
+            ('pkg.b.draw', None, 'b.html#pkg.b.draw', 'function', self.b),
+            ('pkg.a.Shape', 'Shape', 'a.html#pkg.a.Shape', 'class', self.a),
+            ('pkg.a.Shape.area', 'area', 'a.html#area', 'method', self.a),
+            ('pkg.a.CONSTANT', None, None, None, self.a),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.__dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        write_name_table(self.path, self.entries, self.sources)
+        table = NameTable(self.path)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(list(table), sorted(self.entries))
+        self.assertEqual(table.get('pkg.a.Shape'),
+                ('Shape', 'a.html#pkg.a.Shape', 'class', self.a))
+        self.assertEqual(table.get('pkg.a.CONSTANT'),
+                (None, None, None, self.a))
+        self.assertIn('pkg.b.draw', table)
+        self.assertNotIn('pkg.a', table)
+        self.assertNotIn('pkg.b.draw_all', table)
+        self.assertNotIn('z', table)
+        table.close()
+
+    def test_first_entry_for_a_name_wins(self):
+        # Titles and refs may be None, they are never compared
+        write_name_table(self.path, [
+            ('pkg.a.Shape', None, 'a.html#first', 'class', self.a),
+            ('pkg.a.Shape', 'Shape', None, 'class', self.b)], self.sources)
+        table = NameTable(self.path)
+        self.assertEqual(list(table), [
+            ('pkg.a.Shape', None, 'a.html#first', 'class', self.a)])
+        table.close()
+
+    def test_covers_unchanged_sources(self):
+        write_name_table(self.path, self.entries, self.sources)
+        table = NameTable(self.path)
+        self.assertTrue(table.covers(self.sources))
+        os.utime(self.b, (0, 0))
+        self.assertTrue(table.covers([self.a]))
+        self.assertFalse(table.covers([self.a, self.b]))
+        self.assertFalse(table.covers([os.path.join(self.__dir, 'c.py')]))
+        table.close()
+
+    def test_other_files_are_ignored(self):
+        with open(self.path, 'wb') as _:
+            _.write(b'HDPYNT01' + b'\0' * 64)
+        for path in (self.path, os.path.join(self.__dir, 'missing.tbl')):
+            table = NameTable(path)
+            self.assertEqual(len(table), 0)
+            self.assertIsNone(table.get('pkg.a.Shape'))
+            self.assertEqual(list(table), [])
+            self.assertFalse(table.covers([]))
+            table.close()
+
+    def test_empty_table(self):
+        write_name_table(self.path, [], self.sources)
+        table = NameTable(self.path)
+        self.assertIsNone(table.get('pkg.a.Shape'))
+        self.assertTrue(table.covers(self.sources))
+        table.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
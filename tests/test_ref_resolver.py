@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from hotdoc.core.links import Link
+
+from hotdoc_python_extension.python_doc_parser import RefResolver
+
+
+class FakeLinkResolver(object):
+    """Knows about a fixed set of names, and counts the lookups."""
+    def __init__(self, names):
+        self.links = dict((name, Link(name + '.html', name, name))
+                for name in names)
+        self.lookups = []
+
+    def get_named_link(self, name):
+        self.lookups.append(name)
+        return self.links.get(name)
+
+    def add_link(self, link):
+        self.links.setdefault(link.id_, link)
+
+
+class TestRefResolver(unittest.TestCase):
+    def test_module_scoped_candidates(self):
+        link_resolver = FakeLinkResolver(['pkg.mod.Foo', 'pkg.Bar', 'Baz'])
+        resolver = RefResolver()
+        self.assertEqual(resolver.resolve(link_resolver, 'pkg.mod',
+            'Foo').title, 'pkg.mod.Foo')
+        self.assertEqual(resolver.resolve(link_resolver, 'pkg.mod',
+            'Bar').title, 'pkg.Bar')
+        self.assertEqual(resolver.resolve(link_resolver, 'pkg.mod',
+            'Baz').title, 'Baz')
+        self.assertIsNone(resolver.resolve(link_resolver, 'pkg.mod', 'Qux'))
+
+    def test_lookups_are_memoized(self):
+        link_resolver = FakeLinkResolver(['pkg.Bar'])
+        resolver = RefResolver()
+        for _ in range(10):
+            resolver.resolve(link_resolver, 'pkg.mod', 'Bar')
+            resolver.resolve(link_resolver, 'pkg.mod', 'Missing')
+        self.assertEqual(link_resolver.lookups, ['pkg.mod.Bar', 'pkg.Bar',
+            'pkg.mod.Missing', 'pkg.Missing', 'Missing'])
+
+    def test_added_names_invalidate_once(self):
+        link_resolver = FakeLinkResolver([])
+        resolver = RefResolver()
+        self.assertIsNone(resolver.resolve(link_resolver, None, 'Foo'))
+
+        link_resolver.links['Foo'] = Link('foo.html', 'Foo', 'Foo')
+        for i in range(1000):
+            resolver.add_name('Name%d' % i)
+        resolver.add_name('Foo')
+        self.assertEqual(resolver.resolve(link_resolver, None, 'Foo').title,
+                'Foo')
+        resolver.resolve(link_resolver, None, 'Foo')
+        self.assertEqual(link_resolver.lookups, ['Foo', 'Foo'])
+
+
+if __name__ == '__main__':
+    unittest.main()
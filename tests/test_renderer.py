@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import enum
+import unittest
+from unittest import mock
+
+from hotdoc.core.comment import Comment
+from hotdoc.core.links import Link, LinkResolver
+from hotdoc.utils.loggable import Logger
+
+from hotdoc_python_extension import python_doc_parser
+from hotdoc_python_extension.python_doc_parser import (DocstringRenderer,
+        MyRestParser, RefResolver, google_doc_to_native)
+from hotdoc_python_extension.scheduling import ModuleTimings
+
+DOCS = [
+    u'A paragraph referencing :class:`Foo` and ``code``.',
+    u'Title\n=====\n\nA document with a title.',
+    u'Summary.\n\n.. note::\n\n   Mind :func:`Foo` and :class:`Missing`.',
+    u'Example::\n\n    x = 1\n\nAnd *emphasis*.',
+    u'Summary.\n\n* a list\n* of items\n\nThe end.',
+]
+
+
+class FakeDatabase(object):
+    def get_symbol(self, name):
+        return None
+
+
+class FakeExtension(object):
+    def __init__(self, renderer, structured_docstrings=False):
+        self.renderer = renderer
+        self.ref_resolver = RefResolver()
+        self.structured_docstrings = structured_docstrings
+
+    def get_module_name(self, filename):
+        return 'pkg.mod'
+
+
+def _link_resolver():
+    link_resolver = LinkResolver(FakeDatabase())
+    link_resolver.add_link(Link('pkg/foo.html#Foo', 'Foo', 'pkg.Foo'))
+    return link_resolver
+
+
+def _translate(jobs, structured=False):
+    renderer = DocstringRenderer(jobs)
+    extension = FakeExtension(renderer, structured)
+    comments = [Comment(name='pkg.mod.f%d' % i, description=doc,
+        filename='pkg/mod.py') for i, doc in enumerate(DOCS)]
+
+    renderer.start()
+    for comment in comments:
+        renderer.submit(comment.description, structured, comment.filename)
+    renderer.dispatch(ModuleTimings(None))
+
+    parser = MyRestParser(extension)
+    link_resolver = _link_resolver()
+    try:
+        return [parser.translate_comment(comment, link_resolver)
+                for comment in comments], renderer
+    finally:
+        renderer.close()
+
+
+class TestDocstringRenderer(unittest.TestCase):
+    def setUp(self):
+        Logger.reset()
+        Logger.silent = True
+
+    def test_workers_match_serial_rendering(self):
+        for structured in (False, True):
+            serial, _ = _translate(0, structured)
+            parallel, _ = _translate(2, structured)
+            self.assertEqual(parallel, serial)
+            self.assertIn('href="pkg/foo.html#Foo"', serial[0])
+            self.assertIn('<em>Missing</em>', serial[2])
+
+    def test_fragments_come_from_the_workers(self):
+        _, renderer = _translate(2)
+        for doc in DOCS:
+            fragment, messages, refs = renderer.get(doc)
+            self.assertTrue(fragment)
+        self.assertEqual(renderer.get(DOCS[0])[2], [(u'Foo', {})])
+
+    def test_workers_are_not_forked(self):
+        # Forked while other threads hold locks, workers would deadlock
+        with mock.patch.object(python_doc_parser, 'ProcessPoolExecutor') \
+                as executor:
+            DocstringRenderer(2).start()
+        context = executor.call_args[1]['mp_context']
+        self.assertIn(context.get_start_method(), ('forkserver', 'spawn'))
+
+    def test_serial_renderer_renders_nothing(self):
+        _, renderer = _translate(0)
+        self.assertIsNone(renderer.get(DOCS[0]))
+
+
+class TestWarnings(unittest.TestCase):
+    def setUp(self):
+        Logger.reset()
+        Logger.silent = True
+
+    def __warnings(self, doc, structured):
+        extension = FakeExtension(DocstringRenderer(0), structured)
+        comment = Comment(name='pkg.mod.f', description=doc,
+                filename='pkg/mod.py', lineno=0)
+        with mock.patch.object(python_doc_parser, 'warn') as warn:
+            MyRestParser(extension).translate_comment(comment,
+                    _link_resolver())
+        return [(call[1]['message'], call[1]['lineno'])
+                for call in warn.call_args_list]
+
+    def test_structured_blocks_keep_the_line_numbers(self):
+        for doc in (google_doc_to_native(enum.Enum.__doc__)[0].description,
+                u'Summary.\n\n- item::\n\nNot literal.\n\n'
+                u'- item\ncontinued.'):
+            expected = self.__warnings(doc, False)
+            self.assertTrue(expected)
+            self.assertEqual(self.__warnings(doc, True), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from hotdoc_python_extension import python_doc_parser
+from hotdoc_python_extension.python_doc_parser import DocstringRenderer
+from hotdoc_python_extension.scheduling import ModuleTimings
+
+
+class TestModuleTimings(unittest.TestCase):
+    def setUp(self):
+        self.__dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.__dir, 'timings.p')
+
+    def tearDown(self):
+        shutil.rmtree(self.__dir, ignore_errors=True)
+
+    def test_estimates(self):
+        timings = ModuleTimings(None)
+        # From the default rate, then from the rate of the timed modules
+        self.assertAlmostEqual(timings.estimate('render', 'a.py', 1000),
+                0.01)
+        timings.record('render', 'a.py', 2.0, 1000)
+        timings.record('render', 'b.py', 2.0, 3000)
+        self.assertAlmostEqual(timings.estimate('render', 'c.py', 1000), 1.0)
+        # Modules keep their own duration, scaled to their new size
+        self.assertAlmostEqual(timings.estimate('render', 'a.py', 1000), 2.0)
+        self.assertAlmostEqual(timings.estimate('render', 'a.py', 500), 1.0)
+        # Phases are timed separately
+        self.assertAlmostEqual(timings.estimate('scan', 'a.py', 1000), 0.01)
+
+    def test_longest_modules_first(self):
+        timings = ModuleTimings(None)
+        timings.record('scan', 'slow.py', 5.0, 10)
+        timings.record('scan', 'other.py', 1.0, 1000000)
+        self.assertEqual(timings.schedule('scan',
+            {'small.py': 1000, 'big.py': 100000, 'slow.py': 10},
+            min_batch_seconds=0), [['slow.py'], ['big.py'], ['small.py']])
+
+    def test_small_modules_are_batched(self):
+        timings = ModuleTimings(None)
+        sizes = dict(('m%d.py' % i, 1000) for i in range(5))
+        sizes['big.py'] = 10000
+        # Each small module is estimated to 0.01 seconds
+        self.assertEqual(timings.schedule('render', sizes,
+            min_batch_seconds=0.02), [['big.py'], ['m0.py', 'm1.py'],
+                ['m2.py', 'm3.py'], ['m4.py']])
+        self.assertEqual(timings.schedule('render', {}), [])
+
+    def test_timings_are_saved(self):
+        timings = ModuleTimings(self.path)
+        timings.record('render', 'a.py', 2.0, 1000)
+        timings.save()
+        timings = ModuleTimings(self.path)
+        self.assertAlmostEqual(timings.estimate('render', 'a.py', 1000), 2.0)
+
+    def test_other_files_are_ignored(self):
+        with open(self.path, 'wb') as _:
+            _.write(b'not a pickle')
+        timings = ModuleTimings(self.path)
+        self.assertAlmostEqual(timings.estimate('render', 'a.py', 1000),
+                0.01)
+        ModuleTimings(None).save()
+
+
+class FakeExecutor(object):
+    """Runs the batches when they are submitted, and records them."""
+    def __init__(self, max_workers, **kwargs):
+        self.batches = []
+
+    def submit(self, func, modules):
+        self.batches.append([source for source, _ in modules])
+        future = Future()
+        future.set_result(func(modules))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class TestRenderBatches(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(python_doc_parser, 'ProcessPoolExecutor',
+                FakeExecutor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.renderer = DocstringRenderer(2)
+        self.renderer.start()
+        self.executor = self.renderer._DocstringRenderer__executor
+
+    def submit(self, source, count):
+        for i in range(count):
+            self.renderer.submit(u'Docstring %d of %s.' % (i, source),
+                    source=source)
+
+    def test_modules_are_rendered_in_batches(self):
+        timings = ModuleTimings(None)
+        self.submit('slow.py', 1)
+        timings.record('render', 'slow.py', 1.0,
+                len(u'Docstring 0 of slow.py.'))
+        timings.record('render', 'other.py', 1.0, 1000000)
+        self.submit('a.py', 2)
+        self.submit('b.py', 2)
+        self.renderer.dispatch(timings)
+        self.assertEqual(self.executor.batches, [['slow.py'],
+            ['a.py', 'b.py']])
+        self.assertIn(u'Docstring 1 of b.py.',
+                self.renderer.get(u'Docstring 1 of b.py.')[0])
+
+        with mock.patch.object(timings, 'record') as record:
+            self.renderer.record_timings(timings)
+        self.assertEqual(sorted(call[0][1] for call in record.call_args_list),
+                ['a.py', 'b.py', 'slow.py'])
+
+    def test_small_batches_wait_for_the_next_modules(self):
+        timings = ModuleTimings(None)
+        self.submit('a.py', 1)
+        self.renderer.dispatch(timings, complete=False)
+        self.assertEqual(self.executor.batches, [])
+        self.submit('b.py', 1)
+        self.renderer.dispatch(timings)
+        self.assertEqual(self.executor.batches, [['a.py', 'b.py']])
+
+
+if __name__ == '__main__':
+    unittest.main()
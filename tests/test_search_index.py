@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from hotdoc_python_extension.search_index import (SymbolSearchIndex,
+        first_sentence)
+
+_CALLBACK_RE = re.compile(r'^\w+\((.*)\);$', re.S)
+
+
+def _entry(name, summary=u''):
+    return (name, 'mod.html#%s' % name, 'function', summary)
+
+
+class TestFirstSentence(unittest.TestCase):
+    def test_markup_is_stripped(self):
+        self.assertEqual(first_sentence(u'Makes a :class:`Shape`, see '
+            u'*make* and ``draw``. More text.'),
+            u'Makes a Shape, see make and draw.')
+        self.assertEqual(first_sentence(u'Summary on\ntwo lines\n\nBody.'),
+                u'Summary on two lines')
+        self.assertEqual(first_sentence(None), u'')
+
+    def test_long_summaries_are_cut(self):
+        summary = first_sentence(u'word ' * 100)
+        self.assertEqual(len(summary), 160)
+        self.assertTrue(summary.endswith(u'…'))
+
+
+class TestSymbolSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.__dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.__dir, 'index.p')
+        self.output = os.path.join(self.__dir, 'out')
+
+    def tearDown(self):
+        shutil.rmtree(self.__dir, ignore_errors=True)
+
+    def read(self, name):
+        with io.open(os.path.join(self.output, name), encoding='utf-8') as _:
+            return json.loads('[%s]' % _CALLBACK_RE.match(_.read()).group(1))
+
+    def shards(self):
+        return self.read('index.js')[0]['shards']
+
+    def lookup(self, token):
+        """Looks `token` up as a client would, in the shard of its longest
+        prefix."""
+        keys = [key for key in self.shards() if token.startswith(key)]
+        if not keys:
+            return []
+        _, shard = self.read('%s.js' % max(keys, key=len))
+        return [shard['symbols'][i][0]
+                for i in shard['tokens'].get(token, [])]
+
+    def test_names_and_their_words_are_indexed(self):
+        index = SymbolSearchIndex(self.path)
+        index.update_source('a.py', [_entry('pkg.a.make_shape', u'Makes.'),
+            _entry('pkg.a.draw_shape')])
+        index.write(self.output)
+
+        self.assertEqual(self.lookup('make_shape'), ['pkg.a.make_shape'])
+        self.assertEqual(self.lookup('shape'),
+                ['pkg.a.draw_shape', 'pkg.a.make_shape'])
+        # Package and module components are not indexed
+        self.assertEqual(self.lookup('pkg'), [])
+        _, shard = self.read('m.js')
+        self.assertEqual(shard['symbols'], [['pkg.a.make_shape',
+            'mod.html#pkg.a.make_shape', 'function', 'Makes.']])
+
+    def test_large_shards_are_split(self):
+        index = SymbolSearchIndex(self.path)
+        index.update_source('a.py', [_entry('mod.s%d' % i)
+            for i in range(1000)])
+        index.write(self.output)
+
+        shards = self.shards()
+        self.assertNotIn('s', shards)
+        self.assertIn('s1', shards)
+        for key in shards:
+            _, shard = self.read('%s.js' % key)
+            self.assertLessEqual(len(shard['symbols']), 500)
+        self.assertEqual(self.lookup('s999'), ['mod.s999'])
+
+    def test_only_changed_shards_are_written(self):
+        index = SymbolSearchIndex(self.path)
+        index.update_source('a.py', [_entry('mod.alpha')])
+        index.update_source('b.py', [_entry('mod.beta')])
+        index.write(self.output)
+        os.unlink(os.path.join(self.output, 'a.js'))
+
+        # The next build loads the index, b.py changed
+        index = SymbolSearchIndex(self.path)
+        index.update_source('a.py', [_entry('mod.alpha')])
+        index.update_source('b.py', [_entry('mod.beta', u'Changed.')])
+        index.write(self.output)
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'a.js')))
+        self.assertEqual(self.read('b.js')[1]['symbols'][0][3], u'Changed.')
+
+    def test_pruned_sources_are_removed(self):
+        index = SymbolSearchIndex(self.path)
+        index.update_source('a.py', [_entry('mod.alpha')])
+        index.update_source('b.py', [_entry('mod.beta')])
+        index.write(self.output)
+
+        index = SymbolSearchIndex(self.path)
+        index.prune(['b.py'])
+        index.write(self.output)
+        self.assertEqual(self.shards(), ['b'])
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'a.js')))
+
+    def test_cleaned_output_is_written_again(self):
+        index = SymbolSearchIndex(self.path)
+        index.update_source('a.py', [_entry('mod.alpha')])
+        index.write(self.output)
+        shutil.rmtree(self.output)
+
+        index = SymbolSearchIndex(self.path)
+        index.write(self.output)
+        self.assertEqual(self.lookup('alpha'), ['mod.alpha'])
+
+
+if __name__ == '__main__':
+    unittest.main()
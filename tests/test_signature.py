@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2015,2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2015,2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import re
+import unittest
+
+from hotdoc_python_extension.python_doc_parser import _split_signature
+
+# The expressions code item signatures were split with before, they
+# backtrack quadratically or worse on some inputs
+_CALLABLE_RE = \
+re.compile(r"^(?P<pre>.*?)(?P<module>[a-zA-Z0-9_.]*?)(?P<name>[a-zA-Z0-9_]+)\s*\((?P<args>.*?)\)(?P<rest>\s*->.*?)?$")
+_OTHER_RE = \
+re.compile(r"^(?P<pre>.*?)(?P<module>[a-zA-Z0-9_.]*?)(?P<name>[a-zA-Z0-9_]+)\s*$")
+
+_ALPHABET = u'ab_1.() ->*,\n'
+
+
+def _reference(text, callable_):
+    match = (_CALLABLE_RE if callable_ else _OTHER_RE).match(text)
+    return match.groupdict() if match else None
+
+
+class CountingStr(str):
+    """Counts the characters and slices read from it."""
+    reads = 0
+
+    def __getitem__(self, key):
+        CountingStr.reads += 1
+        return str.__getitem__(self, key)
+
+
+def _reads(text, callable_):
+    CountingStr.reads = 0
+    result = _split_signature(CountingStr(text), callable_)
+    return result, CountingStr.reads
+
+
+class TestSplitSignature(unittest.TestCase):
+    def test_matches_regular_expressions(self):
+        rng = random.Random(0)
+        for _ in range(20000):
+            text = u''.join(rng.choice(_ALPHABET)
+                    for _ in range(rng.randint(0, 14)))
+            for callable_ in (True, False):
+                self.assertEqual(_split_signature(text, callable_),
+                        _reference(text, callable_), repr(text))
+
+    def test_common_signatures(self):
+        self.assertEqual(_split_signature(u'pkg.mod.func(a, b=2) -> int',
+            True), {'pre': u'', 'module': u'pkg.mod.', 'name': u'func',
+                'args': u'a, b=2', 'rest': u' -> int'})
+        self.assertEqual(_split_signature(u'static pkg.CONSTANT', False),
+                {'pre': u'static ', 'module': u'pkg.', 'name': u'CONSTANT'})
+
+    def test_long_signature(self):
+        module = u'.'.join(u'pkg%d' % i for i in range(500)) + u'.'
+        args = u', '.join(u'arg%d=[%d]' % (i, i) for i in range(2000))
+        text = u'static ' + module + u'function (' + args + u') -> Result'
+        self.assertEqual(_split_signature(text, True), {'pre': u'static ',
+            'module': module, 'name': u'function', 'args': args,
+            'rest': u' -> Result'})
+        # The arguments are not closed
+        self.assertIsNone(_split_signature(text.replace(u') ->', u' ->'),
+            True))
+        self.assertEqual(_split_signature(module + u'CONSTANT', False),
+                {'pre': u'', 'module': module, 'name': u'CONSTANT'})
+
+    def test_adversarial_input_is_linear(self):
+        # The expressions backtrack quadratically on this
+        small, small_reads = _reads(u'a' * 2000 + u'(', True)
+        large, large_reads = _reads(u'a' * 20000 + u'(', True)
+        self.assertIsNone(small)
+        self.assertIsNone(large)
+        self.assertLess(large_reads, small_reads * 12)
+
+
+if __name__ == '__main__':
+    unittest.main()